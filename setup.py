@@ -15,6 +15,7 @@ setup(
     description='A set of python utilities for more advanced logging.',
     long_description=read('README.rst'),
     tests_require=['testfixtures'],
+    extras_require={'numpy': ['numpy']},
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -1,4 +1,4 @@
-from src.advanced_logger.helpers.config import GlobalConfig
+from .helpers.config import GlobalConfig
 
 
 global_adv_log_config = GlobalConfig()
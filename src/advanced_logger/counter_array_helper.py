@@ -0,0 +1,640 @@
+"""
+Array backed CounterSet for large numbers of counters.  (needs numpy)
+
+ArrayCounterSet keeps the fields for all of its counters in numpy arrays, (value, min_value, max_value, min_counter,
+max_counter, etc... one entry per counter) so bulk operations like clear(), lock(), sum() and the report totals are
+done on the arrays instead of looping over Counter objects.  Indexing the set returns an ArrayCounter view, which has
+the same per counter API as Counter.
+
+usage:
+    counters = ArrayCounterSet(max_counter=1000)
+    for customer_id in customer_ids:
+        counters.new(customer_id)
+
+    counters['cust_1'].add()
+    counters.bulk_update({'cust_1': 10, 'cust_2': 3})
+    print(counters.top(10))
+
+note: call_every / call_func callbacks are not supported.
+"""
+__author__ = 'strohl'
+__version__ = '0.9'
+__status__ = 'Testing'
+
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+
+from .counter_helper import Counter, CounterSet, _bound_over_max, _stepped_min_max, _stepped_value
+from .helpers.general_helper import PercentObj, slugify, _UNSET
+
+__all__ = ['ArrayCounter', 'ArrayCounterSet']
+
+# the int64 / bool arrays for each counter field
+_INT_FIELDS = ('value', 'init_value', 'min_value', 'max_value', 'min_counter', 'max_counter', 'increment_by')
+_BOOL_FIELDS = ('rollover', 'locked')
+
+
+def _sum(values):
+    # int64 sums can overflow for counters near sys.maxsize, those are summed as python ints.
+    if not len(values):
+        return 0
+    if max(int(values.max()), -int(values.min())) <= sys.maxsize // len(values):
+        return int(values.sum())
+    return int(values.sum(dtype=object))
+
+
+class ArrayCounter(object):
+    """
+    A view of one counter in an ArrayCounterSet, with the same API as Counter.
+    """
+    __slots__ = ('_counters', 'key')
+
+    def __init__(self, counters, key):
+        self._counters = counters
+        self.key = key
+
+    @property
+    def _index(self):
+        return self._counters._index[self.key]
+
+    def _get(self, field_name):
+        return int(self._counters._arrays[field_name][self._index])
+
+    def _set(self, field_name, value):
+        self._counters._arrays[field_name][self._index] = value
+
+    @property
+    def value(self):
+        return self._get('value')
+
+    @value.setter
+    def value(self, value):
+        self._set('value', value)
+
+    @property
+    def init_value(self):
+        return self._get('init_value')
+
+    @property
+    def min_value(self):
+        return self._get('min_value')
+
+    @min_value.setter
+    def min_value(self, value):
+        self._set('min_value', value)
+
+    @property
+    def max_value(self):
+        return self._get('max_value')
+
+    @max_value.setter
+    def max_value(self, value):
+        self._set('max_value', value)
+
+    @property
+    def min_counter(self):
+        return self._get('min_counter')
+
+    @property
+    def max_counter(self):
+        return self._get('max_counter')
+
+    @property
+    def increment_by(self):
+        return self._get('increment_by')
+
+    @property
+    def rollover(self):
+        return bool(self._counters._arrays['rollover'][self._index])
+
+    @property
+    def locked(self):
+        return bool(self._counters._arrays['locked'][self._index])
+
+    @property
+    def name(self):
+        return self._counters._names[self._index]
+
+    @property
+    def description(self):
+        return self._counters._descriptions[self._index]
+
+    @property
+    def obj(self):
+        return self._counters._objs[self._index]
+
+    @property
+    def perc_decimal(self):
+        return self._counters.def_counter_kwargs['perc_decimal']
+
+    @property
+    def _perc(self):
+        max_counter = self.max_counter
+        if max_counter == sys.maxsize:
+            return None
+        return PercentObj(current=self.value, min_count=self.min_counter, max_count=max_counter,
+                          decimal_prec=self.perc_decimal)
+
+    @property
+    def perc(self):
+        tmp_perc = self._perc
+        if tmp_perc is None:
+            raise AttributeError('Percentage is not currently set')
+        return tmp_perc
+
+    def lock(self):
+        self._set('locked', True)
+
+    def unlock(self):
+        self._set('locked', False)
+
+    def set_max(self, max_counter, value=None):
+        self._set('max_counter', max_counter or sys.maxsize)
+        if value is None:
+            self.set(self.value)
+        else:
+            self.set(value)
+
+    def clear(self, force=False):
+        if self.locked and not force:
+            return
+        self.value = self.init_value
+        self.clear_min_max(force=force)
+
+    def clear_min_max(self, force=False):
+        if self.locked and not force:
+            return
+        value = self.value
+        self.min_value = value
+        self.max_value = value
+
+    def add(self, value=_UNSET):
+        return self.add_many(1, value)
+
+    def sub(self, value=_UNSET):
+        return self.sub_many(1, value)
+
+    def add_many(self, n_times, value=_UNSET):
+        """
+        the same as calling add(value) n_times, (see Counter.add_many)
+        """
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            for i in range(n_times):
+                self.add_many(1, self.value)
+            return self.value
+        self._update_many(self.value, int(value), n_times, self.max_counter, 1)
+        return self.value
+
+    def sub_many(self, n_times, value=_UNSET):
+        """
+        the same as calling sub(value) n_times, (see Counter.sub_many)
+        """
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            for i in range(n_times):
+                self.sub_many(1, self.value / 2)
+            return self.value
+        self._update_many(-self.value, int(value), n_times, -self.min_counter, -1)
+        return self.value
+
+    def _update_many(self, start, step, n_times, max_counter, sign):
+        # see Counter._update_many
+        if n_times <= 0:
+            return
+        rollover = self.rollover
+        range_size = self.max_counter - self.min_counter + 1
+        first = _bound_over_max(start + step, max_counter, range_size, rollover)
+        low, high = _stepped_min_max(first, step, n_times, max_counter, range_size, rollover)
+        if sign < 0:
+            low, high = -high, -low
+        self.value = sign * _stepped_value(first, step, n_times, max_counter, range_size, rollover)
+        self.min_value = min(self.min_value, low)
+        self.max_value = max(self.max_value, high)
+
+    def set(self, value):
+        if self.locked:
+            return
+        value = min(max(int(value), self.min_counter), self.max_counter)
+        self.value = value
+        self.min_value = min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+        return value
+
+    def get_data(self, *field_names, as_dict=False):
+        # the same as Counter.get_data, but the row is only looked up once.
+        counters = self._counters
+        index = self._index
+        arrays = counters._arrays
+        data = dict(
+            name=counters._names[index],
+            key=self.key,
+            value=int(arrays['value'][index]),
+            obj=counters._objs[index],
+            min_value=int(arrays['min_value'][index]),
+            max_value=int(arrays['max_value'][index]),
+            min_counter=int(arrays['min_counter'][index]),
+            max_counter=int(arrays['max_counter'][index]),
+            description=counters._descriptions[index],
+        )
+        if data['max_counter'] != sys.maxsize:
+            data['perc'] = PercentObj(current=data['value'], min_count=data['min_counter'],
+                                      max_count=data['max_counter'], decimal_prec=self.perc_decimal)
+        if not field_names:
+            field_names = ['name', 'key', 'value', 'perc', 'obj', 'min_value', 'max_value', 'min_counter',
+                           'max_counter', 'description']
+            if 'perc' not in data:
+                field_names.remove('perc')
+            if not data['description']:
+                field_names.remove('description')
+            if not data['name']:
+                field_names.remove('name')
+            if not data['key']:
+                field_names.remove('key')
+        if not as_dict:
+            return [data[fn] if fn in data else getattr(self, fn) for fn in field_names]
+        return {fn: data[fn] if fn in data else getattr(self, fn) for fn in field_names}
+
+    __iadd__ = Counter.__iadd__
+    __isub__ = Counter.__isub__
+    __int__ = Counter.__int__
+    __call__ = Counter.__call__
+    format = Counter.format
+    __str__ = Counter.__str__
+    __repr__ = Counter.__repr__
+    __bool__ = Counter.__bool__
+    __compare__ = Counter.__compare__
+    __eq__ = Counter.__eq__
+    __lt__ = Counter.__lt__
+    __le__ = Counter.__le__
+    __gt__ = Counter.__gt__
+    __ge__ = Counter.__ge__
+    __hash__ = None
+
+
+class _ArrayCounterViews(Mapping):
+    """
+    the "counters" mapping for an ArrayCounterSet, {key: ArrayCounter}
+    """
+
+    def __init__(self, counters):
+        self._counters = counters
+        self._views = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._views[key]
+        except KeyError:
+            if key not in self._counters._index:
+                raise
+            view = self._views[key] = ArrayCounter(self._counters, key)
+            return view
+
+    def __iter__(self):
+        return iter(self._counters._keys)
+
+    def __len__(self):
+        return len(self._counters._keys)
+
+    def __contains__(self, key):
+        return key in self._counters._index
+
+
+class ArrayCounterSet(CounterSet):
+    """
+    CounterSet with the counter fields held in numpy arrays.
+
+    The per counter API (set['key'].add(), set.key.value, etc...) is the same as CounterSet, the bulk operations
+    (clear, lock, unlock, bulk_update, sum, min, max, top, percs and the report totals) are vectorized.
+    """
+    # the views do not report their changes, the report totals are worked out from the arrays instead.
+    _track_changes = False
+
+    def __init__(self, *args, locked=False, min_counter=0, max_counter=None, rollover=False, increment_by=1,
+                 perc_decimal=None, capacity=64, **kwargs):
+        """
+        @param capacity: the initial size of the arrays, (they grow as needed)
+        """
+        self.def_counter_kwargs = dict(
+            value=min_counter,
+            min_counter=min_counter,
+            max_counter=max_counter,
+            rollover=rollover,
+            increment_by=increment_by,
+            perc_decimal=perc_decimal,
+        )
+        self.pending_counters = {}
+        self._keys = []
+        self._index = {}
+        self._names = []
+        self._descriptions = []
+        self._objs = []
+        self._arrays = {}
+        for f in _INT_FIELDS:
+            self._arrays[f] = np.zeros(capacity, dtype=np.int64)
+        for f in _BOOL_FIELDS:
+            self._arrays[f] = np.zeros(capacity, dtype=bool)
+        self._views = _ArrayCounterViews(self)
+
+        for arg in args:
+            self.new(arg)
+
+        for key, value in kwargs.items():
+            if isinstance(value, int):
+                self.new(key, value)
+            elif isinstance(value, dict):
+                self.new(key, **value)
+            elif isinstance(value, str):
+                self.new(key, name=value)
+
+        self.locked = locked
+
+    @property
+    def counters(self):
+        return self._views
+
+    def _array(self, field_name):
+        return self._arrays[field_name][:len(self._keys)]
+
+    def _grow(self):
+        for f, arr in self._arrays.items():
+            new_arr = np.zeros(max(len(arr) * 2, 16), dtype=arr.dtype)
+            new_arr[:len(arr)] = arr
+            self._arrays[f] = new_arr
+
+    def new(self, key, value=None, force=False, name=None, description=None, obj=None, **kwargs):
+        """
+        add new counter, (see CounterSet.new)
+
+            .new(key, value)
+            .new([key, value])
+            .new(key, value, name=xxx, min_counter=x, max_counter=x, rollover=T/F, increment_by=x, description=xxx)
+        """
+        if isinstance(key, (list, tuple)):
+            if value is not None:
+                raise AttributeError('Invalid key/value passed: %s/%s' % (key, value))
+            key, value = key
+        if isinstance(key, Counter):
+            counter = key
+            key = counter.key
+            value = counter.value
+            name = counter.name
+            description = counter.description
+            obj = counter.obj
+            kwargs = dict(min_counter=counter.min_counter, max_counter=counter.max_counter,
+                          rollover=counter.rollover, increment_by=counter.increment_by)
+        elif not isinstance(key, str):
+            raise AttributeError('Invalid key passed: %r' % key)
+        if 'call_func' in kwargs or 'call_every' in kwargs:
+            raise AttributeError('ArrayCounterSet does not support call_func / call_every')
+
+        tmp_kwargs = self.def_counter_kwargs.copy()
+        tmp_kwargs.update(kwargs)
+        if value is not None:
+            tmp_kwargs['value'] = value
+        if name is None:
+            name = key
+            key = slugify(key)
+
+        min_counter = tmp_kwargs['min_counter'] or 0
+        max_counter = tmp_kwargs['max_counter'] or sys.maxsize
+        value = min(max(int(tmp_kwargs['value']), min_counter), max_counter)
+
+        if key in self._index:
+            if not force:
+                raise AttributeError('Key %r already exists in CounterSet' % key)
+            index = self._index[key]
+        else:
+            index = len(self._keys)
+            if index >= len(self._arrays['value']):
+                self._grow()
+            self._keys.append(key)
+            self._names.append(None)
+            self._descriptions.append(None)
+            self._objs.append(None)
+            self._index[key] = index
+
+        self._names[index] = name
+        self._descriptions[index] = description
+        self._objs[index] = obj
+        arrays = self._arrays
+        arrays['value'][index] = value
+        arrays['init_value'][index] = tmp_kwargs['value']
+        # the same as Counter, (which starts at 0 before the first set)
+        arrays['min_value'][index] = min(value, 0)
+        arrays['max_value'][index] = max(value, 0)
+        arrays['min_counter'][index] = min_counter
+        arrays['max_counter'][index] = max_counter
+        arrays['increment_by'][index] = tmp_kwargs['increment_by']
+        arrays['rollover'][index] = tmp_kwargs['rollover']
+        arrays['locked'][index] = False
+        return self._views[key]
+
+    def _indexes(self, keys):
+        if not keys:
+            return slice(0, len(self._keys))
+        index = self._index
+        return np.fromiter((index[k] for k in keys), dtype=np.intp, count=len(keys))
+
+    def lock(self, *keys):
+        if not keys:
+            self.locked = True
+        self._arrays['locked'][self._indexes(keys)] = True
+
+    def unlock(self, *keys):
+        if not keys:
+            self.locked = False
+        self._arrays['locked'][self._indexes(keys)] = False
+
+    def clear(self, *keys):
+        if self.locked:
+            return
+        rows = self._indexes(keys)
+        arrays = self._arrays
+        unlocked = ~arrays['locked'][rows]
+        value = np.where(unlocked, arrays['init_value'][rows], arrays['value'][rows])
+        arrays['value'][rows] = value
+        arrays['min_value'][rows] = np.where(unlocked, value, arrays['min_value'][rows])
+        arrays['max_value'][rows] = np.where(unlocked, value, arrays['max_value'][rows])
+
+    def remove(self, *keys):
+        if self.locked:
+            return
+        remove_rows = [self._index[k] for k in keys if k in self._index and not self._arrays['locked'][self._index[k]]]
+        if not remove_rows:
+            return
+        keep = np.ones(len(self._keys), dtype=bool)
+        keep[remove_rows] = False
+        for f, arr in self._arrays.items():
+            kept = arr[:len(self._keys)][keep]
+            arr[:len(kept)] = kept
+        remove_rows = set(remove_rows)
+        for values in (self._keys, self._names, self._descriptions, self._objs):
+            values[:] = [v for i, v in enumerate(values) if i not in remove_rows]
+        self._index = {k: i for i, k in enumerate(self._keys)}
+        self._views = _ArrayCounterViews(self)
+
+    def clear_all(self):
+        if self.locked:
+            return
+        del self._keys[:], self._names[:], self._descriptions[:], self._objs[:]
+        self._index = {}
+        self._views = _ArrayCounterViews(self)
+
+    def bulk_update(self, deltas):
+        """
+        applies a set of aggregated updates in one step, (see CounterSet.bulk_update)
+
+        int deltas are applied to all of the counters at once, (n_times, value) deltas are applied one counter at
+        a time.
+        """
+        keys = []
+        steps = []
+        for key, delta in deltas.items():
+            if isinstance(delta, tuple):
+                self._views[key].add_many(*delta)
+            elif delta:
+                keys.append(key)
+                steps.append(delta)
+        if not keys:
+            return
+
+        arrays = self._arrays
+        rows = self._indexes(keys)
+        steps = np.asarray(steps, dtype=np.int64)
+        start = arrays['value'][rows]
+        min_counter = arrays['min_counter'][rows]
+        max_counter = arrays['max_counter'][rows]
+        rollover = arrays['rollover'][rows]
+        active = ~arrays['locked'][rows]
+
+        # counters that start out of range (add() only checks max_counter, sub() only checks min_counter) are done
+        # one at a time, so the first call is bounded the same way.
+        adding = steps > 0
+        out_of_range = active & np.where(adding, start > max_counter, start < min_counter)
+        for i in np.nonzero(out_of_range)[0]:
+            if adding[i]:
+                self._views[keys[i]].add_many(int(steps[i]), 1)
+            else:
+                self._views[keys[i]].sub_many(int(-steps[i]), 1)
+        active &= ~out_of_range
+        if not active.any():
+            return
+        rows, steps, start, min_counter, max_counter, rollover, adding = (
+            x[active] for x in (rows, steps, start, min_counter, max_counter, rollover, adding))
+
+        # the room left before the bound is passed is checked instead of start + steps, so counters without a
+        # max_counter (sys.maxsize) do not overflow the int64 arrays.  (if the room or range overflow, they are larger
+        # than any int64 step)
+        with np.errstate(over='ignore'):
+            range_size = max_counter - min_counter + 1
+            room = np.where(adding, max_counter - start, start - min_counter)
+        can_roll = rollover & (max_counter >= min_counter)
+        range_fits = range_size > 0
+        safe_range = np.where(range_fits, range_size, 1)
+        distance = np.abs(steps)
+        passed = (room >= 0) & (distance > room)
+        rolled = passed & can_roll
+        rolled_over = rolled & adding
+        rolled_under = rolled & ~adding
+        wrapped = distance - room - 1
+        wrapped = np.where(range_fits, wrapped % safe_range, wrapped)
+
+        value = np.where(passed, np.where(adding, max_counter, min_counter), start + steps)
+        value = np.where(rolled_over, min_counter + wrapped, value)
+        value = np.where(rolled_under, max_counter - wrapped, value)
+
+        # the values from steps of 1 only go one way until they roll over, after that they have passed every value
+        # to the other end of the range.
+        first = np.where(adding, np.where(start < max_counter, start + 1, max_counter),
+                         np.where(start > min_counter, start - 1, min_counter))
+        low = np.where(adding, first, value)
+        high = np.where(adding, value, first)
+        low = np.where(rolled_over, np.minimum(first, min_counter), low)
+        high = np.where(rolled_over, max_counter, high)
+        low = np.where(rolled_under, min_counter, low)
+        high = np.where(rolled_under, np.maximum(first, max_counter), high)
+
+        arrays['value'][rows] = value
+        arrays['min_value'][rows] = np.minimum(arrays['min_value'][rows], low)
+        arrays['max_value'][rows] = np.maximum(arrays['max_value'][rows], high)
+
+    def _report_totals(self, counters):
+        if len(counters) == len(self._keys):
+            rows = slice(0, len(self._keys))
+            names = self._names
+        else:
+            rows = [self._index[c] for c in counters]
+            names = [self._names[i] for i in rows]
+        if not names:
+            return 0, 0, 0, 0
+        arrays = self._arrays
+        return (
+            max(map(len, names)),
+            min(int(arrays['min_value'][rows].min()), 0),
+            max(int(arrays['max_value'][rows].max()), 0),
+            _sum(arrays['value'][rows]),
+        )
+
+    def values(self):
+        for value in self._array('value'):
+            yield int(value)
+
+    def sum(self):
+        return _sum(self._array('value'))
+
+    def min(self):
+        """
+        returns the (key, value) of the counter with the lowest value, (None if empty)
+        """
+        if not self._keys:
+            return None
+        index = int(self._array('value').argmin())
+        return self._keys[index], int(self._arrays['value'][index])
+
+    def max(self):
+        """
+        returns the (key, value) of the counter with the highest value, (None if empty)
+        """
+        if not self._keys:
+            return None
+        index = int(self._array('value').argmax())
+        return self._keys[index], int(self._arrays['value'][index])
+
+    def top(self, num=10, lowest=False):
+        """
+        returns a list of (key, value) for the num counters with the highest (or lowest) values.
+        """
+        values = self._array('value')
+        if lowest:
+            values = -values
+        num = min(num, len(values))
+        if num <= 0:
+            return []
+        indexes = np.argpartition(-values, num - 1)[:num]
+        indexes = indexes[np.argsort(-values[indexes], kind='stable')]
+        return [(self._keys[i], int(self._arrays['value'][i])) for i in indexes]
+
+    def percs(self):
+        """
+        returns an array of the counter percentages (0-100), NaN for counters without a max_counter.
+        """
+        value = self._array('value')
+        min_counter = self._array('min_counter')
+        max_counter = self._array('max_counter')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tmp_ret = (value - min_counter) / (max_counter - min_counter) * 100
+        tmp_ret = np.clip(tmp_ret, 0, 100)
+        tmp_ret[max_counter == sys.maxsize] = np.nan
+        return np.round(tmp_ret, self.def_counter_kwargs['perc_decimal'] or 0)
+
+    def __repr__(self):
+        return 'ArrayCounterSet: %s objects' % len(self)
@@ -10,13 +10,89 @@ __status__ = 'Testing'
 import decimal
 from collections import OrderedDict
 import sys
-from .helpers import make_list, slugify
-# from advanced_counter.helpers import make_list, _UNSET, slugify, PercentObj
+import threading
+import weakref
+from .helpers.general_helper import make_list, slugify, _UNSET, PercentObj
 import logging
 
 log = logging.getLogger(__name__)
 
-__all__ = ['NamedCounter', 'Counter', 'CounterSet']
+__all__ = ['NamedCounter', 'Counter', 'ShardedCounter', 'CounterSet']
+
+
+def _roll_over_max(value, max_counter, range_size):
+    """
+    rolls a value that went over max_counter back into the range, the same as repeatedly subtracting range_size
+    until it is at or under max_counter, without the loop.
+    """
+    if range_size <= 0:
+        return max_counter
+    return max_counter - (max_counter - value) % range_size
+
+
+def _roll_under_min(value, min_counter, range_size):
+    """
+    rolls a value that went under min_counter back into the range, the same as repeatedly adding range_size
+    until it is at or over min_counter, without the loop.
+    """
+    if range_size <= 0:
+        return min_counter
+    return min_counter + (value - min_counter) % range_size
+
+
+def _bound_over_max(value, max_counter, range_size, rollover):
+    """
+    the value after an add, (rolled over or clamped if it went over max_counter)
+    """
+    if max_counter is not None and value > max_counter:
+        if rollover:
+            return _roll_over_max(value, max_counter, range_size)
+        return max_counter
+    return value
+
+
+def _stepped_value(first, step, n_times, max_counter, range_size, rollover):
+    """
+    returns the value after adding step n_times, (with _bound_over_max applied after each add) where first is the
+    value after the first add.
+
+    After the first add the value is always at or under max_counter, and from there n adds of step end at the same
+    value as one add of (step * n).
+    """
+    return _bound_over_max(first + step * (n_times - 1), max_counter, range_size, rollover)
+
+
+def _stepped_min_max(first, step, n_times, max_counter, range_size, rollover):
+    """
+    returns the (lowest, highest) values reached by adding step n_times, (see _stepped_value)
+    """
+    last = _stepped_value(first, step, n_times, max_counter, range_size, rollover)
+    low, high = min(first, last), max(first, last)
+    n_times -= 1
+    if not rollover or step <= 0 or max_counter is None or first + step * n_times <= max_counter:
+        # the values only go one way
+        return low, high
+
+    # between rollovers the values only go up, so only the values on each side of a rollover are checked.  Once a
+    # value after a rollover repeats, the rest of the values have all been seen.
+    seen = set()
+    value = first
+    remaining = n_times
+    while remaining > 0:
+        steps = max((max_counter - value) // step + 1, 1)
+        if steps > remaining:
+            break
+        if steps > 1:
+            low = min(low, value + step)
+            high = max(high, value + step * (steps - 1))
+        value = _roll_over_max(value + step * steps, max_counter, range_size)
+        low = min(low, value)
+        high = max(high, value)
+        remaining -= steps
+        if value in seen:
+            break
+        seen.add(value)
+    return low, high
 
 
 class AdvCounter(object):
@@ -109,9 +185,6 @@ class AdvCounter(object):
                         raise TypeError('Invalid value passed (%r) in dictionary key %r' % (value, key))
 
         elif isinstance(increment_by, str):
-
-            if increment_by[0]:
-
             self.increment_type = 'str'
         else:
             self.increment_type = 'int'
@@ -134,10 +207,7 @@ class AdvCounter(object):
             except KeyError:
                 return self.increment_by['_default_']
         else:
-            return self.increemnt
-
-        if increment_index is None:
-
+            return self.increment_by
 
     def clear(self):
         self.value = self.min_counter
@@ -152,8 +222,8 @@ class AdvCounter(object):
             self.value += int(value)
             if self.value > self.max_counter:
                 if self.rollover:
-                    while self.value > self.max_counter:
-                        self.value = self.min_counter + (self.value - self.max_counter)
+                    # value - (max - min) until it is <= max
+                    self.value = _roll_over_max(self.value, self.max_counter, self.max_counter - self.min_counter)
                 else:
                     self.value = self.max_counter
         else:
@@ -175,9 +245,8 @@ class AdvCounter(object):
             self.value -= int(value)
             if self.value < self.min_counter:
                 if self.rollover:
-                    while self.value < self.min_counter:
-                        tmp_diff = self.min_counter - self.value
-                        self.value = self.max_counter - tmp_diff
+                    # value + (max - min) until it is >= min
+                    self.value = _roll_under_min(self.value, self.min_counter, self.max_counter - self.min_counter)
                 else:
                     self.value = self.min_counter
         else:
@@ -469,6 +538,9 @@ class NamedCounter(object):
 
 
 class Counter(object):
+    # the changed key sets of the CounterSets this counter is in, (see CounterSet.report)
+    _change_sets = ()
+    _tracks_changes = True
 
     def __init__(self, name=None, value=0, key=None, obj=None, min_counter=0, max_counter=None, rollover=False,
                  increment_by=1, perc_decimal=0, call_every=None, call_func=None, call_in_class=None, description=None):
@@ -604,6 +676,11 @@ class Counter(object):
             return
         self.min_value = self.value
         self.max_value = self.value
+        self._changed()
+
+    def _changed(self):
+        for changed_keys in self._change_sets:
+            changed_keys.add(self.key)
 
     def add(self, value=_UNSET):
         if self.locked:
@@ -616,8 +693,9 @@ class Counter(object):
         if self.max_counter is not None:
             if self.value > self.max_counter:
                 if self.rollover:
-                    while self.value > self.max_counter:
-                        self.value = self.min_counter + (self.value - self.max_counter) -1
+                    # value - (max - min + 1) until it is <= max
+                    self.value = _roll_over_max(self.value, self.max_counter,
+                                                self.max_counter - self.min_counter + 1)
                 else:
                     self.value = self.max_counter
         self._update()
@@ -636,14 +714,85 @@ class Counter(object):
         if self.min_counter is not None:
             if self.value < self.min_counter:
                 if self.rollover:
-                    while self.value < self.min_counter:
-                        tmp_diff = self.min_counter - self.value
-                        self.value = self.max_counter - tmp_diff + 1
+                    # value + (max - min + 1) until it is >= min
+                    self.value = _roll_under_min(self.value, self.min_counter,
+                                                 self.max_counter - self.min_counter + 1)
                 else:
                     self.value = self.min_counter
         self._update()
         return self.value
 
+    def add_many(self, n_times, value=_UNSET):
+        """
+        the same as calling add(value) n_times, done in one step.
+
+        min_value / max_value end up the same as they would with n_times add() calls, and call_func is called the
+        same number of times, (with the value set to what it would have been at that call)
+        """
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            # adds the current value each time
+            for i in range(n_times):
+                self.add(None)
+            return self.value
+        self._update_many(self.value, int(value), n_times, self.max_counter, 1)
+        return self.value
+
+    def sub_many(self, n_times, value=_UNSET):
+        """
+        the same as calling sub(value) n_times, done in one step.  (see add_many)
+        """
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            # subtracts half the current value each time
+            for i in range(n_times):
+                self.sub(None)
+            return self.value
+        if self.min_counter is None:
+            max_counter = None
+        else:
+            max_counter = -self.min_counter
+        self._update_many(-self.value, int(value), n_times, max_counter, -1)
+        return self.value
+
+    def _update_many(self, start, step, n_times, max_counter, sign):
+        # works in "add" terms, for sub the values are negated (sign = -1) so the min_counter becomes the max_counter.
+        if n_times <= 0:
+            return
+        if self.rollover and self.max_counter is not None and self.min_counter is not None:
+            range_size = self.max_counter - self.min_counter + 1
+        else:
+            # only used to roll over, (add() / sub() clamp to the max / min without it)
+            range_size = None
+        first = _bound_over_max(start + step, max_counter, range_size, self.rollover)
+
+        if self.call_countdown is not None:
+            # the add call numbers that the callback is called on
+            call_step = self.call_countdown
+            while call_step <= n_times:
+                self.value = sign * _stepped_value(first, step, call_step, max_counter, range_size, self.rollover)
+                if self._perc is not None:
+                    self._perc.set(self.value)
+                self.call_func(self)
+                call_step += max(self.call_counter, 1)
+            self.call_countdown = call_step - n_times
+
+        low, high = _stepped_min_max(first, step, n_times, max_counter, range_size, self.rollover)
+        if sign < 0:
+            low, high = -high, -low
+        self.value = sign * _stepped_value(first, step, n_times, max_counter, range_size, self.rollover)
+        self.min_value = min(self.min_value, low)
+        self.max_value = max(self.max_value, high)
+        if self._perc is not None:
+            self._perc.set(self.value)
+        self._changed()
+
     def set(self, value):
         if self.locked:
             return
@@ -670,6 +819,7 @@ class Counter(object):
         self.max_value = max(self.max_value, self.value)
         if self._perc is not None:
             self._perc.set(self.value)
+        self._changed()
 
     def __iadd__(self, other):
         self.add(other)
@@ -825,13 +975,201 @@ class Counter(object):
         return 2
 
 
+class _CounterShard(object):
+    __slots__ = ('delta', 'call_countdown', 'thread_ref')
+
+    def __init__(self):
+        self.delta = 0
+        self.call_countdown = None
+        self.thread_ref = None
+
+
+class ShardedCounter(Counter):
+    """
+    Counter that can be updated from many threads at once without locking.
+
+    Each thread adds / subtracts into its own shard, the value is the sum of the shards, worked out when it is read.
+    (int(), .value, format(), CounterSet.report(), etc...)
+
+    Differences from Counter:
+        min_counter / max_counter (and rollover) are applied to the total when it is read, not after each add/sub.
+        min_value / max_value are the lowest / highest values seen when the counter was read.
+        call_func is called every "call_every" updates per thread.
+        set() and clear() are not thread safe with updates from other threads.
+
+    Shards for threads that have ended are reused by new threads, so the number of shards is the max number of
+    threads that updated the counter at the same time.
+    """
+    # the shard updates are not tracked, a CounterSet re-reads these counters for every report.
+    _tracks_changes = False
+
+    def __init__(self, *args, **kwargs):
+        self._base = 0
+        self._shards = []
+        self._shard_lock = threading.Lock()
+        self._local = threading.local()
+        self._min_value = 0
+        self._max_value = 0
+        super(ShardedCounter, self).__init__(*args, **kwargs)
+
+    def _get_shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        with self._shard_lock:
+            for shard in self._shards:
+                owner = shard.thread_ref()
+                if owner is None or not owner.is_alive():
+                    # the thread that owned this shard has ended, its delta is kept and this thread adds to it.
+                    break
+            else:
+                shard = _CounterShard()
+                self._shards.append(shard)
+            shard.thread_ref = weakref.ref(threading.current_thread())
+            shard.call_countdown = self.call_counter
+        self._local.shard = shard
+        return shard
+
+    def _bounded_value(self, value):
+        if self.max_counter is not None and value > self.max_counter:
+            if self.rollover:
+                value = _roll_over_max(value, self.max_counter, self.max_counter - self.min_counter + 1)
+            else:
+                value = self.max_counter
+        elif self.min_counter is not None and value < self.min_counter:
+            if self.rollover:
+                value = _roll_under_min(value, self.min_counter, self.max_counter - self.min_counter + 1)
+            else:
+                value = self.min_counter
+        return value
+
+    @property
+    def value(self):
+        tmp_value = self._base
+        for shard in self._shards:
+            tmp_value += shard.delta
+        return self._bounded_value(tmp_value)
+
+    @value.setter
+    def value(self, value):
+        # the base is set so that base + the shard deltas == value, so the shards are never written by other threads.
+        tmp_delta = 0
+        for shard in self._shards:
+            tmp_delta += shard.delta
+        self._base = value - tmp_delta
+
+    @property
+    def min_value(self):
+        value = self.value
+        if value < self._min_value:
+            self._min_value = value
+        return self._min_value
+
+    @min_value.setter
+    def min_value(self, value):
+        self._min_value = value
+
+    @property
+    def max_value(self):
+        value = self.value
+        if value > self._max_value:
+            self._max_value = value
+        return self._max_value
+
+    @max_value.setter
+    def max_value(self, value):
+        self._max_value = value
+
+    @property
+    def perc(self):
+        tmp_perc = super(ShardedCounter, self).perc
+        tmp_perc.set(self.value)
+        return tmp_perc
+
+    def add(self, value=_UNSET):
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            value = self.value
+        self._get_shard().delta += int(value)
+        self._update()
+        return self.value
+
+    def sub(self, value=_UNSET):
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            value = self.value / 2
+        self._get_shard().delta -= int(value)
+        self._update()
+        return self.value
+
+    def add_many(self, n_times, value=_UNSET):
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            for i in range(n_times):
+                self.add(None)
+            return self.value
+        shard = self._get_shard()
+        shard.delta += int(value) * n_times
+        self._update_shard_many(shard, n_times)
+        return self.value
+
+    def sub_many(self, n_times, value=_UNSET):
+        if self.locked:
+            return
+        if value is _UNSET:
+            value = self.increment_by
+        if value is None:
+            for i in range(n_times):
+                self.sub(None)
+            return self.value
+        shard = self._get_shard()
+        shard.delta -= int(value) * n_times
+        self._update_shard_many(shard, n_times)
+        return self.value
+
+    def _update(self):
+        if self.call_counter is not None:
+            shard = self._get_shard()
+            shard.call_countdown -= 1
+            if shard.call_countdown <= 0:
+                shard.call_countdown = self.call_counter
+                self.call_func(self)
+
+    def _update_shard_many(self, shard, n_times):
+        if self.call_counter is not None and n_times > 0:
+            call_step = shard.call_countdown
+            while call_step <= n_times:
+                self.call_func(self)
+                call_step += max(self.call_counter, 1)
+            shard.call_countdown = call_step - n_times
+
+
 class CounterSet(object):
     counters = None
     def_counter_kwargs = None
     locked = False
+    # T/F keep the report totals and lines up to date as the counters change, (see report)
+    _track_changes = True
 
     def __init__(self, *args, locked=False, min_counter=0, max_counter=None, rollover=False, increment_by=1,
-                 perc_decimal=None, **kwargs):
+                 perc_decimal=None, sharded=False, **kwargs):
+        """
+        @param sharded: T/F if True, new counters are ShardedCounters, (safe to update from many threads)
+        """
+        if sharded:
+            self.counter_class = ShardedCounter
+        else:
+            self.counter_class = Counter
         self.def_counter_kwargs = dict(
             value=min_counter,
             min_counter=min_counter,
@@ -843,6 +1181,16 @@ class CounterSet(object):
         self.counters = OrderedDict()
         self.pending_counters = {}
 
+        # keys of the counters that changed since the last report, (the counters add to this set)
+        self._changed_keys = set()
+        self._untracked_keys = set()
+        # {key: (name length, value, min_value, max_value)} as of the last report
+        self._report_seen = {}
+        # [name pad size, min_value, max_value, value sum] or None if it needs to be rebuilt from _report_seen
+        self._report_totals_cache = [0, 0, 0, 0]
+        self._line_cache = {}
+        self._line_cache_key = None
+
         for arg in args:
             self.new(arg)
 
@@ -904,14 +1252,14 @@ class CounterSet(object):
             else:
                 tmp_kwargs['key'] = key
 
-            key = Counter(**tmp_kwargs)
+            key = self.counter_class(**tmp_kwargs)
         elif isinstance(key, (list, tuple)):
             if value is not None:
                 raise AttributeError('Invalid key/value passed: %s/%s' % (key, value))
             tmp_kwargs = self.def_counter_kwargs.copy()
             tmp_kwargs['value'] = key[1]
             tmp_kwargs['name'] = key[0]
-            key = Counter(**tmp_kwargs)
+            key = self.counter_class(**tmp_kwargs)
         elif not isinstance(key, Counter):
             raise AttributeError('Invalid key passed: %r' % key)
 
@@ -920,18 +1268,61 @@ class CounterSet(object):
         if key.key in self and not force:
             raise AttributeError('Key %r already exists in CounterSet' % key.key)
 
+        if key.key in self.counters:
+            self._detach(key.key)
         self.counters[key.key] = key
+        self._attach(key)
         return key
 
+    def _attach(self, counter):
+        counter._change_sets += (self._changed_keys,)
+        if not counter._tracks_changes:
+            self._untracked_keys.add(counter.key)
+        self._changed_keys.add(counter.key)
+
+    def _detach(self, key):
+        counter = self.counters[key]
+        counter._change_sets = tuple(s for s in counter._change_sets if s is not self._changed_keys)
+        self._untracked_keys.discard(key)
+        self._changed_keys.discard(key)
+        self._line_cache.pop(key, None)
+        seen = self._report_seen.pop(key, None)
+        totals = self._report_totals_cache
+        if seen is not None and totals is not None:
+            if seen[0] == totals[0] or seen[2] == totals[1] or seen[3] == totals[2]:
+                self._report_totals_cache = None
+            else:
+                totals[3] -= seen[1]
+
     def get(self, key):
         return self.counters[key]
 
+    def bulk_update(self, deltas):
+        """
+        applies a set of aggregated updates in one step.
+
+        @param deltas: {key: delta}, where delta is one of:
+            int: the number of add(1) calls to make, (or sub(1) calls if it is negative)
+            (n_times, value): the same as n_times add(value) calls
+            min_value / max_value and callbacks are the same as if the calls were made one at a time.
+        """
+        counters = self.counters
+        for key, delta in deltas.items():
+            counter = counters[key]
+            if isinstance(delta, tuple):
+                counter.add_many(*delta)
+            elif delta >= 0:
+                counter.add_many(delta, 1)
+            else:
+                counter.sub_many(-delta, 1)
+
     def remove(self, *keys):
         if self.locked:
             return
         for key in keys:
             if key in self.counters:
                 if not self.counters[key].locked:
+                    self._detach(key)
                     del self.counters[key]
 
     def clear(self, *keys):
@@ -946,6 +1337,8 @@ class CounterSet(object):
         if self.locked:
             return
 
+        for key in list(self.counters):
+            self._detach(key)
         self.counters.clear()
 
     def __str__(self):
@@ -978,31 +1371,35 @@ class CounterSet(object):
             default without max_counter = "{indent}{name} : {value}
         @param kwargs: These are passed to the formatting for the lines as well as the header/footer.
         @return:
+
+        The totals and the formatted lines are kept between reports, and only updated for the counters that changed,
+        (through their add/sub/set/clear methods) so reports for large sets only cost as much as the changes.
         """
+        if self._track_changes:
+            self._refresh_report()
+
         tmp_line_formating_dict = kwargs.copy()
         tmp_line_formating_dict['pad_field'] = None
         tmp_line_formating_dict['pad_field_size'] = None
         tmp_line_formating_dict['pad_field_dir'] = justify_name
 
-        if counters is None:
+        all_counters = counters is None
+        if all_counters:
             counters = self.counters.keys()
         else:
             counters = make_list(counters)
 
         if justify_name is not None:
             tmp_line_formating_dict['pad_field'] = 'name'
-        tmp_pad_size = 0
         all_value_min = 0
         all_value_max = 0
         all_value_sum = 0
 
         if justify_name is not None or header or footer:
-            for c in counters:
-                c_rec = self.counters[c]
-                tmp_pad_size = max(tmp_pad_size, len(c_rec.name))
-                all_value_max = max(c_rec.max_value, all_value_max)
-                all_value_min = min(c_rec.min_value, all_value_min)
-                all_value_sum += c_rec.value
+            if self._track_changes and all_counters:
+                tmp_pad_size, all_value_min, all_value_max, all_value_sum = self._report_totals_cache
+            else:
+                tmp_pad_size, all_value_min, all_value_max, all_value_sum = self._report_totals(counters)
             tmp_line_formating_dict['pad_field_size'] = tmp_pad_size
 
         tmp_hf_dict = dict(
@@ -1026,15 +1423,21 @@ class CounterSet(object):
         else:
             tmp_line_formating_dict['line_indent'] = line_indent
 
+        line_cache = self._get_line_cache(line_format, tmp_line_formating_dict)
         tmp_lines = []
         for c in counters:
-            c_rec = self.counters[c]
-            tmp_hf_dict[c] = c_rec
-
-            tmp_lines.append(c_rec.format(line_format, **tmp_line_formating_dict))
+            try:
+                tmp_line = line_cache[c]
+            except KeyError:
+                tmp_line = line_cache[c] = self.counters[c].format(line_format, **tmp_line_formating_dict)
+            tmp_lines.append(tmp_line)
 
         tmp_lines = '\n'.join(tmp_lines)
 
+        if header or footer:
+            for c in counters:
+                tmp_hf_dict[c] = self.counters[c]
+
         tmp_hf_dict.update(kwargs)
 
         tmp_ret = []
@@ -1052,6 +1455,79 @@ class CounterSet(object):
 
         return '\n'.join(tmp_ret)
 
+    def _get_line_cache(self, line_format, line_formating_dict):
+        # the cached lines are only good for the same line format and options, if they can't be cached, a new
+        # (throw away) dict is returned.
+        if not self._track_changes:
+            return {}
+        try:
+            cache_key = (line_format, tuple(sorted(line_formating_dict.items())))
+            hash(cache_key)
+        except TypeError:
+            self._line_cache_key = None
+            self._line_cache = {}
+            return {}
+        if cache_key != self._line_cache_key:
+            self._line_cache_key = cache_key
+            self._line_cache = {}
+        return self._line_cache
+
+    def _refresh_report(self):
+        """
+        updates the report totals and drops the cached lines for the counters that changed since the last report.
+        """
+        changed_keys = set(self._changed_keys)
+        self._changed_keys.difference_update(changed_keys)
+        changed_keys.update(self._untracked_keys)
+
+        totals = self._report_totals_cache
+        for c in changed_keys:
+            c_rec = self.counters.get(c)
+            if c_rec is None:
+                continue
+            self._line_cache.pop(c, None)
+            seen = (len(c_rec.name), c_rec.value, c_rec.min_value, c_rec.max_value)
+            old_seen = self._report_seen.get(c)
+            self._report_seen[c] = seen
+            if totals is None:
+                continue
+            if old_seen is not None:
+                if (seen[0] < old_seen[0] == totals[0] or seen[2] > old_seen[2] == totals[1] or
+                        seen[3] < old_seen[3] == totals[2]):
+                    # the counter held the lowest / highest value, so the others have to be checked again.
+                    totals = None
+                    continue
+                totals[3] -= old_seen[1]
+            totals[0] = max(totals[0], seen[0])
+            totals[1] = min(totals[1], seen[2])
+            totals[2] = max(totals[2], seen[3])
+            totals[3] += seen[1]
+
+        if totals is None:
+            totals = [0, 0, 0, 0]
+            for seen in self._report_seen.values():
+                totals[0] = max(totals[0], seen[0])
+                totals[1] = min(totals[1], seen[2])
+                totals[2] = max(totals[2], seen[3])
+                totals[3] += seen[1]
+        self._report_totals_cache = totals
+
+    def _report_totals(self, counters):
+        """
+        returns the name pad size, lowest min_value, highest max_value and the value sum for the report.
+        """
+        tmp_pad_size = 0
+        all_value_min = 0
+        all_value_max = 0
+        all_value_sum = 0
+        for c in counters:
+            c_rec = self.counters[c]
+            tmp_pad_size = max(tmp_pad_size, len(c_rec.name))
+            all_value_max = max(c_rec.max_value, all_value_max)
+            all_value_min = min(c_rec.min_value, all_value_min)
+            all_value_sum += c_rec.value
+        return tmp_pad_size, all_value_min, all_value_max, all_value_sum
+
     def keys(self):
         return self.counters.keys()
 
@@ -0,0 +1,322 @@
+"""
+Aggregating sink for DataLogger records.
+
+Instead of writing one line per request, records are summarised in process per
+(request_type, method, normalized url, response_code), and the summaries are written to the data_log logger every
+"flush_interval" seconds.  Each summary keeps fixed size log-linear histogram of the response times, so p50/p95/p99
+are still available without keeping the raw records.
+"""
+__author__ = 'strohl'
+__version__ = '0.9'
+__status__ = 'Testing'
+
+import atexit
+import re
+import threading
+from array import array
+from time import monotonic
+
+from .data_logger_helper import data_log, log
+
+__all__ = ['DataLogAggregateSink', 'LatencyHistogram', 'normalize_url', 'log_summary_header']
+
+
+def log_summary_header():
+    tmp_ret = [
+        'interval_sec',
+        'request_type',
+        'method',
+        'url',
+        'response_code',
+        'count',
+        'errors',
+        'retries',
+        'response_bytes',
+        'min_sec',
+        'p50_sec',
+        'p95_sec',
+        'p99_sec',
+        'max_sec',
+    ]
+    data_log.info(','.join(tmp_ret))
+
+
+_URL_QUERY_RE = re.compile(r'[?#].*$')
+_URL_ID_RE = re.compile(r'/(?:\d+|[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}|'
+                        r'[0-9a-fA-F]{16,})(?=/|$)')
+
+
+def normalize_url(url):
+    """
+    removes the query string, and replaces numeric, uuid and long hex path segments with "{id}"
+    so "https://x.com/v1/users/123/vms/abc?x=1" becomes "https://x.com/v1/users/{id}/vms/abc"
+    """
+    if not isinstance(url, str):
+        url = str(url)
+    url = _URL_QUERY_RE.sub('', url)
+    return _URL_ID_RE.sub('/{id}', url)
+
+
+class LatencyHistogram(object):
+    """
+    Fixed size log-linear histogram of durations.
+
+    Durations are counted in whole microseconds, values below 2 ** sub_bits each get their own bucket, above that
+    every power of 2 is split into 2 ** (sub_bits - 1) linear buckets, so the relative error of any percentile is
+    below 1 / 2 ** (sub_bits - 1).  (~6% with the default of 5)  Values over max_sec are counted in the last bucket.
+    """
+    __slots__ = ('sub_bits', 'counts', 'count', 'total', 'min_value', 'max_value', '_linear', '_half', '_max_us')
+
+    def __init__(self, sub_bits=5, max_sec=3600 * 24):
+        self.sub_bits = sub_bits
+        self._linear = 1 << sub_bits
+        self._half = self._linear >> 1
+        self._max_us = int(max_sec * 1000000)
+        self.counts = array('Q', bytes(8 * (self._index(self._max_us) + 1)))
+        self.count = 0
+        self.total = 0.0
+        self.min_value = None
+        self.max_value = None
+
+    def _index(self, value_us):
+        if value_us < self._linear:
+            return value_us
+        shift = value_us.bit_length() - self.sub_bits
+        return self._linear + (shift - 1) * self._half + ((value_us >> shift) - self._half)
+
+    def _bucket_range(self, index):
+        if index < self._linear:
+            return index, index
+        shift, offset = divmod(index - self._linear, self._half)
+        shift += 1
+        low = (offset + self._half) << shift
+        return low, low + (1 << shift) - 1
+
+    def add(self, seconds):
+        if seconds is None:
+            return
+        if seconds < 0:
+            seconds = 0.0
+        value_us = min(int(seconds * 1000000), self._max_us)
+        self.counts[self._index(value_us)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min_value is None or seconds < self.min_value:
+            self.min_value = seconds
+        if self.max_value is None or seconds > self.max_value:
+            self.max_value = seconds
+
+    def percentile(self, perc):
+        """
+        returns the approximate duration (in seconds) for a percentile (0-100), or None if empty.
+        """
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * perc // 100))
+        running = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                running += bucket_count
+                if running >= target:
+                    low, high = self._bucket_range(index)
+                    tmp_ret = (low + high) / 2 / 1000000
+                    return min(max(tmp_ret, self.min_value), self.max_value)
+        return self.max_value
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def clear(self):
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min_value = None
+        self.max_value = None
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return 'LatencyHistogram: %s values, p50=%s p99=%s' % (self.count, self.percentile(50), self.percentile(99))
+
+
+class _AggregateStats(object):
+    __slots__ = ('count', 'errors', 'retries', 'response_bytes', 'histogram')
+
+    def __init__(self, sub_bits):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.response_bytes = 0
+        self.histogram = LatencyHistogram(sub_bits=sub_bits)
+
+
+# field indexes in the DataLogger.end() field tuple
+_REQUEST_TYPE = 4
+_URL = 5
+_METHOD = 6
+_RETRY_NUM = 7
+_RESPONSE_CODE = 10
+_RESPONSE_SIZE = 11
+_RESPONSE_TIME = 12
+_IS_ERROR = 15
+
+OTHER_URL = '[other]'
+
+
+class DataLogAggregateSink(object):
+    """
+    DataLogger sink that aggregates records and writes summaries to the data_log logger.
+
+    usage:
+        sink = DataLogAggregateSink(flush_interval=60)
+        with DataLogger(account, url, 'GET', sink=sink) as dl:
+            ...
+
+    summary lines (see log_summary_header()):
+        interval_sec|request_type|method|url|response_code|count|errors|retries|response_bytes|min|p50|p95|p99|max
+    """
+
+    def __init__(self, flush_interval=60, url_normalizer=normalize_url, max_keys=10000, percentiles=(50, 95, 99),
+                 sub_bits=5, sink=None, background=True):
+        """
+        @param flush_interval: seconds between summaries.
+        @param url_normalizer: function used to normalize the url for the key (None to use the url as is)
+        @param max_keys: once this many keys are tracked in an interval, new urls are counted under "[other]".
+        @param percentiles: the percentiles included in the summary lines.
+        @param sub_bits: histogram precision (see LatencyHistogram)
+        @param sink: if passed, records are also passed to this sink (for sampled raw logging for example)
+        @param background: T/F if True, a daemon thread writes the summaries every flush_interval, otherwise they are
+            only written by a write() call after the interval has passed, or by calling flush().
+        """
+        self.flush_interval = flush_interval
+        self.url_normalizer = url_normalizer
+        self.max_keys = max_keys
+        self.percentiles = percentiles
+        self.sub_bits = sub_bits
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._interval_start = monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name='DataLogAggregateSink', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception('Error writing data log summary')
+
+    def write(self, fields, trim_to=1000):
+        url = fields[_URL]
+        if self.url_normalizer is not None:
+            url = self.url_normalizer(url)
+        key = (fields[_REQUEST_TYPE], fields[_METHOD], url, fields[_RESPONSE_CODE])
+        retry_num = fields[_RETRY_NUM]
+        response_size = fields[_RESPONSE_SIZE]
+
+        with self._lock:
+            try:
+                stats = self._stats[key]
+            except KeyError:
+                if len(self._stats) >= self.max_keys:
+                    key = (key[0], key[1], OTHER_URL, key[3])
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = _AggregateStats(self.sub_bits)
+            stats.count += 1
+            if fields[_IS_ERROR]:
+                stats.errors += 1
+            if retry_num is not None and retry_num > 0:
+                stats.retries += 1
+            if response_size:
+                stats.response_bytes += response_size
+            stats.histogram.add(fields[_RESPONSE_TIME])
+            flush_due = self._thread is None and monotonic() - self._interval_start >= self.flush_interval
+
+        if self.sink is not None:
+            self.sink.write(fields, trim_to)
+        if flush_due:
+            self.flush()
+
+    def summaries(self, clear=False):
+        """
+        returns a list of summary dicts for the current interval.
+        @param clear: T/F start a new interval.
+        """
+        with self._lock:
+            stats = self._stats
+            interval = monotonic() - self._interval_start
+            if not clear:
+                # the live stats can be updated by write(), so the rows are built while holding the lock.
+                return self._summary_rows(stats, interval)
+            self._stats = {}
+            self._interval_start = monotonic()
+        # write() only updates the new dict from here on, so the old one can be read without the lock.
+        return self._summary_rows(stats, interval)
+
+    def _summary_rows(self, stats, interval):
+        tmp_ret = []
+        for (request_type, method, url, response_code), stat in stats.items():
+            tmp_rec = dict(
+                interval_sec=interval,
+                request_type=request_type,
+                method=method,
+                url=url,
+                response_code=response_code,
+                count=stat.count,
+                errors=stat.errors,
+                retries=stat.retries,
+                response_bytes=stat.response_bytes,
+                min_sec=stat.histogram.min_value,
+                max_sec=stat.histogram.max_value,
+            )
+            for perc in self.percentiles:
+                tmp_rec['p%s_sec' % perc] = stat.histogram.percentile(perc)
+            tmp_ret.append(tmp_rec)
+        return tmp_ret
+
+    def flush(self):
+        """
+        writes the summaries for the current interval to the data_log logger and starts a new interval.
+        """
+        for rec in self.summaries(clear=True):
+            tmp_ret_l = [
+                '%.3f' % rec['interval_sec'],
+                str(rec['request_type']),
+                str(rec['method']),
+                str(rec['url']),
+                str(rec['response_code']),
+                str(rec['count']),
+                str(rec['errors']),
+                str(rec['retries']),
+                str(rec['response_bytes']),
+                str(rec['min_sec']),
+            ]
+            for perc in self.percentiles:
+                tmp_ret_l.append(str(rec['p%s_sec' % perc]))
+            tmp_ret_l.append(str(rec['max_sec']))
+            data_log.info('|'.join(s.replace('|', ':') for s in tmp_ret_l))
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        atexit.unregister(self.close)
+
+    def __len__(self):
+        return len(self._stats)
+
+    def __repr__(self):
+        return 'DataLogAggregateSink: %s keys' % len(self._stats)
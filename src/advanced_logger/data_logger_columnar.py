@@ -0,0 +1,441 @@
+"""
+Columnar binary sink and reader for DataLogger records.
+
+The file is append only, and is made up of a file header followed by blocks of records.  Each block holds the
+columns for up to "block_rows" records, stored one after the other as native arrays, so the reader can memory-map
+the file and load whole columns without parsing any text.
+
+file header:
+    magic (6 bytes: b'DLCOL1'), byte order (1 byte: b'<' or b'>'), padding (1 byte)
+
+block:
+    magic (4 bytes: b'DLBK'), number of rows (uint32), number of new dictionary strings (uint32), padding (uint32)
+    sections, each: length in bytes (uint64) + data + padding to 8 bytes
+        new dictionary strings (offsets: uint64 x (n + 1), then utf-8 data)
+        numeric columns, in NUMERIC_COLUMNS order
+        dictionary columns (uint32 index into the string dictionary), in DICT_COLUMNS order
+        text columns (offsets: uint64 x (rows + 1), then utf-8 data), in TEXT_COLUMNS order
+
+The string dictionary is shared by the whole file, each block only adds the strings that were not used before.
+"""
+__author__ = 'strohl'
+__version__ = '0.9'
+__status__ = 'Testing'
+
+import atexit
+import mmap
+import struct
+import sys
+import threading
+from array import array
+from datetime import datetime
+
+from .data_logger_helper import quote
+
+__all__ = ['DataLogColumnarSink', 'DataLogColumnarReader']
+
+
+FILE_MAGIC = b'DLCOL1'
+BLOCK_MAGIC = b'DLBK'
+_FILE_HEADER = struct.Struct('=6scx')
+_BLOCK_HEADER = struct.Struct('=4sIII')
+_SECTION_LEN = struct.Struct('=Q')
+
+# (column name, field index in the DataLogger.end() field tuple, array typecode)
+NUMERIC_COLUMNS = (
+    ('start_time', 1, 'd'),
+    ('retry_num', 7, 'q'),
+    ('retry_delta_sec', 8, 'd'),
+    ('response_size', 11, 'q'),
+    ('response_time', 12, 'd'),
+    ('is_error', 15, 'B'),
+    ('is_parent', 2, 'B'),
+)
+
+DICT_COLUMNS = (
+    ('account', 0),
+    ('request_type', 4),
+    ('url', 5),
+    ('method', 6),
+    ('response_code', 10),
+)
+
+TEXT_COLUMNS = (
+    ('session_id', 3),
+    ('request_data', 9),
+    ('response_text', 13),
+    ('response_headers', 14),
+)
+
+# missing (or unparseable) values in the numeric columns
+NULL_INT = -1
+NULL_FLOAT = float('nan')
+
+_INT_MIN = -2 ** 63
+_INT_MAX = 2 ** 63 - 1
+
+
+def _to_epoch(value):
+    if value is None:
+        return NULL_FLOAT
+    try:
+        if isinstance(value, datetime):
+            return value.timestamp()
+        return float(value)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return NULL_FLOAT
+
+
+def _to_float(value):
+    if value is None:
+        return NULL_FLOAT
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return NULL_FLOAT
+
+
+def _to_int(value):
+    if value is None:
+        return NULL_INT
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return NULL_INT
+    if _INT_MIN <= value <= _INT_MAX:
+        return value
+    return NULL_INT
+
+
+_CONVERTERS = {
+    'start_time': _to_epoch,
+    'retry_num': _to_int,
+    'retry_delta_sec': _to_float,
+    'response_size': _to_int,
+    'response_time': _to_float,
+    'is_error': lambda value: 1 if value else 0,
+    'is_parent': lambda value: 1 if value == 'parent' else 0,
+}
+
+_ARRAY_ITEM_SIZES = {tc: array(tc).itemsize for tc in 'dqBIQ'}
+if _ARRAY_ITEM_SIZES['I'] != 4 or _ARRAY_ITEM_SIZES['Q'] != 8 or _ARRAY_ITEM_SIZES['q'] != 8:
+    raise ImportError('Columnar data log needs 4 byte "I" and 8 byte "q"/"Q" array types')
+
+
+def _column_sections():
+    # {column name: (section index in a block, array typecode or None for text columns)}, section 0 is the dictionary
+    names = [(name, tc) for name, index, tc in NUMERIC_COLUMNS]
+    names += [(name, 'I') for name, index in DICT_COLUMNS]
+    names += [(name, None) for name, index in TEXT_COLUMNS]
+    return {name: (section_index, tc) for section_index, (name, tc) in enumerate(names, 1)}
+
+
+_COLUMN_SECTIONS = _column_sections()
+_SECTION_COUNT = 1 + len(_COLUMN_SECTIONS)
+
+
+def _pack_strings(strings):
+    offsets = array('Q', [0])
+    data = bytearray()
+    for s in strings:
+        data += s.encode('utf-8')
+        offsets.append(len(data))
+    return offsets.tobytes() + bytes(data)
+
+
+def _section(data):
+    pad = -len(data) % 8
+    return _SECTION_LEN.pack(len(data)) + data + b'\0' * pad
+
+
+class DataLogColumnarSink(object):
+    """
+    DataLogger sink that appends records to a columnar binary file.
+
+    Records are buffered in memory and written a block at a time, call flush() or close() to write a partial block.
+    (close() is also called at exit)
+
+    usage:
+        sink = DataLogColumnarSink('/var/log/app/data_log.dlc')
+        with DataLogger(account, url, 'GET', sink=sink) as dl:
+            ...
+    """
+
+    def __init__(self, filename, block_rows=1024):
+        """
+        @param filename: the file to append to, it is created (with a file header) if needed.
+        @param block_rows: the number of records buffered before a block is written.
+        """
+        self.filename = filename
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+        self._dictionary = {}
+        self._new_strings = []
+        self._rows = 0
+        self._clear_buffers()
+
+        self._file = open(filename, 'ab+')
+        self._file.seek(0)
+        if self._file.read(_FILE_HEADER.size):
+            # only the dictionary sections are read, (see DataLogColumnarReader)
+            with DataLogColumnarReader(filename) as reader:
+                for value in reader.dictionary:
+                    self._dictionary[value] = len(self._dictionary)
+                data_end = reader.data_end
+            if self._file.seek(0, 2) > data_end:
+                # drops a block that was only partly written, so the new blocks follow the last complete one.
+                self._file.truncate(data_end)
+        else:
+            self._file.write(_FILE_HEADER.pack(FILE_MAGIC, b'<' if sys.byteorder == 'little' else b'>'))
+            self._file.flush()
+        atexit.register(self.close)
+
+    def _clear_buffers(self):
+        self._numeric = [array(tc) for name, index, tc in NUMERIC_COLUMNS]
+        self._dict_ids = [array('I') for name, index in DICT_COLUMNS]
+        self._text = [[] for name, index in TEXT_COLUMNS]
+        self._new_strings = []
+        self._rows = 0
+
+    def _string_id(self, value):
+        try:
+            return self._dictionary[value]
+        except KeyError:
+            string_id = self._dictionary[value] = len(self._dictionary)
+            self._new_strings.append(value)
+            return string_id
+
+    def write(self, fields, trim_to=1000):
+        # the whole row is converted before any column is appended to, so a bad value can't leave the columns with
+        # different lengths.
+        numeric = [_CONVERTERS[name](fields[index]) for name, index, tc in NUMERIC_COLUMNS]
+        strings = ['' if fields[index] is None else str(fields[index]) for name, index in DICT_COLUMNS]
+        text = [quote(fields[index], trim_to) for name, index in TEXT_COLUMNS]
+        with self._lock:
+            for col, value in zip(self._numeric, numeric):
+                col.append(value)
+            for col, value in zip(self._dict_ids, strings):
+                col.append(self._string_id(value))
+            for col, value in zip(self._text, text):
+                col.append(value)
+            self._rows += 1
+            if self._rows >= self.block_rows:
+                self._write_block()
+
+    def _write_block(self):
+        if not self._rows:
+            return
+        tmp_ret = [
+            _BLOCK_HEADER.pack(BLOCK_MAGIC, self._rows, len(self._new_strings), 0),
+            _section(_pack_strings(self._new_strings)),
+        ]
+        for col in self._numeric:
+            tmp_ret.append(_section(col.tobytes()))
+        for col in self._dict_ids:
+            tmp_ret.append(_section(col.tobytes()))
+        for col in self._text:
+            tmp_ret.append(_section(_pack_strings(col)))
+        self._file.write(b''.join(tmp_ret))
+        self._file.flush()
+        self._clear_buffers()
+
+    def flush(self):
+        with self._lock:
+            self._write_block()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write_block()
+            self._file.close()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __repr__(self):
+        return 'DataLogColumnarSink: %s (%s buffered)' % (self.filename, self._rows)
+
+
+class DataLogColumnarReader(object):
+    """
+    Reads a file written by DataLogColumnarSink.
+
+    The file is memory-mapped, and only the block and section headers are read when it is opened.  Columns are read
+    from the map when they are asked for, so reading one column does not load the others, and text is only decoded
+    for the text columns that are asked for.  A last block that was only partly written (by a writer that stopped
+    part way through it) is skipped.
+
+    usage:
+        with DataLogColumnarReader('/var/log/app/data_log.dlc') as reader:
+            times = reader['response_time']         # array('d', [...])
+            urls = reader.column('url')             # ['http://...', ...]
+            url_ids = reader.column('url', decode=False)    # array('I', [...]) of indexes into reader.dictionary
+            for view in reader.column_views('response_time'):   # memoryviews over the file, (no copy)
+                ...
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.rows = 0
+        # the offset after the last complete block
+        self.data_end = 0
+        self._dictionary = None
+        # [(rows, number of new dictionary strings, [(offset, length) for each section])]
+        self._blocks = []
+        self._file = open(filename, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            self._mmap = None
+        self._swap = False
+        self._load()
+
+    def _load(self):
+        if self._mmap is None:
+            return
+        data = self._mmap
+        size = len(data)
+        magic, byte_order = _FILE_HEADER.unpack_from(data, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError('%s is not a columnar data log file' % self.filename)
+        self._swap = byte_order != (b'<' if sys.byteorder == 'little' else b'>')
+        pos = self.data_end = _FILE_HEADER.size
+
+        while pos + _BLOCK_HEADER.size <= size:
+            magic, rows, new_strings, pad = _BLOCK_HEADER.unpack_from(data, pos)
+            if magic != BLOCK_MAGIC:
+                raise ValueError('Invalid block at offset %s in %s' % (pos, self.filename))
+            pos += _BLOCK_HEADER.size
+
+            sections = []
+            while len(sections) < _SECTION_COUNT and pos + _SECTION_LEN.size <= size:
+                length = _SECTION_LEN.unpack_from(data, pos)[0]
+                pos += _SECTION_LEN.size
+                if pos + length + (-length % 8) > size:
+                    break
+                sections.append((pos, length))
+                pos += length + (-length % 8)
+            if len(sections) < _SECTION_COUNT:
+                # the rest of the file is a block that was only partly written.
+                break
+            self._blocks.append((rows, new_strings, sections))
+            self.rows += rows
+            self.data_end = pos
+
+    def _iter_sections(self, section_index):
+        # yields (rows, memoryview of the section) for each block, the views are released once the next is read.
+        for rows, new_strings, sections in self._blocks:
+            offset, length = sections[section_index]
+            with memoryview(self._mmap)[offset:offset + length] as section:
+                yield rows, new_strings, section
+
+    @property
+    def dictionary(self):
+        """
+        the dictionary strings, (decoded the first time they are used)
+        """
+        if self._dictionary is None:
+            dictionary = []
+            for rows, new_strings, section in self._iter_sections(0):
+                dictionary.extend(self._unpack_strings(section, new_strings))
+            self._dictionary = dictionary
+        return self._dictionary
+
+    def _unpack_strings(self, section, count):
+        offsets = array('Q')
+        offsets.frombytes(section[:(count + 1) * 8])
+        if self._swap:
+            offsets.byteswap()
+        text = section[(count + 1) * 8:]
+        return [str(text[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(count)]
+
+    def column_views(self, name):
+        """
+        returns a list with a memoryview of a numeric or dictionary column for each block, straight over the
+        memory-mapped file.  (no copy, except for a file written with the other byte order, those are returned as
+        byte swapped arrays)  The views must be released before close() is called.
+        """
+        try:
+            section_index, typecode = _COLUMN_SECTIONS[name]
+        except KeyError:
+            raise KeyError('Invalid column name: %r' % name)
+        if typecode is None:
+            raise KeyError('%r is a text column, use column() for it' % name)
+        tmp_ret = []
+        for rows, new_strings, section in self._iter_sections(section_index):
+            if self._swap:
+                col = array(typecode)
+                col.frombytes(section)
+                col.byteswap()
+                tmp_ret.append(col)
+            else:
+                tmp_ret.append(section.cast(typecode))
+        return tmp_ret
+
+    @property
+    def column_names(self):
+        return [c[0] for c in NUMERIC_COLUMNS] + [c[0] for c in DICT_COLUMNS] + [c[0] for c in TEXT_COLUMNS]
+
+    def column(self, name, decode=True):
+        """
+        returns the values for a column.
+        @param name: the column name
+        @param decode: for dictionary columns, if False, the array of dictionary indexes is returned instead of the
+            strings.
+        """
+        try:
+            section_index, typecode = _COLUMN_SECTIONS[name]
+        except KeyError:
+            raise KeyError('Invalid column name: %r' % name)
+        if typecode is None:
+            tmp_ret = []
+            for rows, new_strings, section in self._iter_sections(section_index):
+                tmp_ret.extend(self._unpack_strings(section, rows))
+            return tmp_ret
+
+        tmp_ret = array(typecode)
+        for rows, new_strings, section in self._iter_sections(section_index):
+            tmp_ret.frombytes(section)
+        if self._swap:
+            tmp_ret.byteswap()
+        if typecode == 'I' and decode:
+            dictionary = self.dictionary
+            return [dictionary[i] for i in tmp_ret]
+        return tmp_ret
+
+    def columns(self, *names, decode=True):
+        if not names:
+            names = self.column_names
+        return {name: self.column(name, decode=decode) for name in names}
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # views from column_views() are still in use, the map is closed once they are released.
+                pass
+        self._file.close()
+
+    def __getitem__(self, item):
+        return self.column(item)
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __repr__(self):
+        return 'DataLogColumnarReader: %s (%s records)' % (self.filename, self.rows)
@@ -8,11 +8,20 @@ __version__ = '0.9'
 __status__ = 'Testing'
 
 
+import atexit
 import logging
-from uuid import uuid1
-from advanced_counter.helpers import get_now
+import os
+import threading
+import weakref
+from itertools import count
+from collections import deque
+from datetime import datetime
+from time import perf_counter_ns, time
+from uuid import uuid4
 
-__all__ = ['DataLogger']
+from .helpers.formating_helper import _BoundedRepr
+
+__all__ = ['DataLogger', 'DataLogWriter', 'DataLogTextSink']
 
 """
 Data log specs:
@@ -48,8 +57,242 @@ def log_data_header():
 #  "log_date","start_time","parent_child","session_id","request_type","url","method","retry_numb","retry_delta_sec","request_data","response_code","response_size","response_time","response_text","response_headers","is_error"
 
 
+# indexes of the record fields that are rendered with str() instead of being quoted.
+_UNQUOTED_FIELDS = frozenset((7, 8, 11))
+# index of the start time field (epoch seconds), rendered as a datetime string.
+_START_TIME_FIELD = 1
+
+
+# values of these types are formatted with a bounded repr, so large payloads are not formatted in full.
+_BOUNDED_REPR_TYPES = (dict, list, tuple, set, frozenset, deque)
+
+
+def quote(text_in, trim_to=1000):
+    if not isinstance(text_in, str):
+        if isinstance(text_in, (bytes, bytearray)):
+            # every byte is at least one character in the repr, so only the first trim_to bytes can be in the output.
+            text_in = repr(text_in[:trim_to])
+        elif isinstance(text_in, _BOUNDED_REPR_TYPES):
+            text_in = _BoundedRepr(trim_to).repr(text_in)
+        else:
+            text_in = repr(text_in)
+    # every character is replaced by at least one character, so only the first trim_to characters can end up in the
+    # output, trimming before the replacements keeps large response bodies from being scanned and copied in full.
+    if text_in and text_in[0] == '"' and text_in[-1] == '"':
+        # the surrounding quotes are stripped in the same slice.
+        text_in = text_in[1:min(len(text_in) - 1, trim_to + 1)]
+    else:
+        text_in = text_in[:trim_to]
+    if '"' in text_in:
+        text_in = text_in.replace('"', "'")
+    if '\n' in text_in:
+        text_in = text_in.replace('\n', ' - ')
+        text_in = text_in[:trim_to]
+    if '|' in text_in:
+        text_in = text_in.replace('|', ':')
+
+    return text_in
+
+
+def format_record(fields, trim_to=1000):
+    """
+    quotes and joins the raw field tuple from DataLogger.end() into the pipe delimited log line.
+    """
+    tmp_ret_l = []
+    for index, field in enumerate(fields):
+        if index == _START_TIME_FIELD:
+            tmp_ret_l.append(str(datetime.fromtimestamp(field)))
+        elif index in _UNQUOTED_FIELDS:
+            tmp_ret_l.append(str(field))
+        else:
+            tmp_ret_l.append(quote(field, trim_to))
+    return '|'.join(tmp_ret_l)
+
+
+def emit_record(tmp_ret_l):
+    data_log.info(tmp_ret_l)
+    log.debug(tmp_ret_l)
+
+
+class DataLogTextSink(object):
+    """
+    The default DataLogger sink, writes the pipe delimited text record to the data_log / log loggers.
+
+    A sink is any object with a write(fields, trim_to) method that takes the raw field tuple from DataLogger.end()
+    (in the order of log_data_header(), with the account first).
+    """
+
+    def write(self, fields, trim_to=1000):
+        tmp_ret_l = format_record(fields, trim_to)
+        emit_record(tmp_ret_l)
+        return tmp_ret_l
+
+
+TEXT_SINK = DataLogTextSink()
+
+
+class DataLogWriter(object):
+    """
+    Background writer for DataLogger records.
+
+    DataLogger.end() pushes the raw field tuple onto a bounded queue, and a daemon thread does the quoting, joining
+    and handler dispatch in batches, so slow log handlers do not add to request latency.
+
+    usage:
+        writer = DataLogWriter(max_size=10000, on_full=DataLogWriter.DROP_OLDEST)
+        with DataLogger(account, url, 'GET', writer=writer) as dl:
+            ...
+    """
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEW = 'drop_new'
+
+    def __init__(self, max_size=10000, on_full=BLOCK, batch_size=100, start=True):
+        """
+        @param max_size: the max number of records waiting to be written.
+        @param on_full: what to do when the queue is full:
+            DataLogWriter.BLOCK: wait for space in the queue (default)
+            DataLogWriter.DROP_OLDEST: drop the oldest waiting record to make room for the new one.
+            DataLogWriter.DROP_NEW: drop the new record.
+        @param batch_size: the max number of records taken from the queue and written in one pass.
+        @param start: T/F start the writer thread now (otherwise call .start())
+        """
+        if on_full not in (self.BLOCK, self.DROP_OLDEST, self.DROP_NEW):
+            raise AttributeError('Invalid on_full option: %r' % on_full)
+        self.max_size = max_size
+        self.on_full = on_full
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = deque()
+        self._in_process = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        if start:
+            self.start()
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='DataLogWriter', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def put(self, fields, trim_to=1000, sink=TEXT_SINK):
+        """
+        queues a raw record for writing to the sink, returns False if the record was dropped.
+
+        once the writer has been stopped, records are written straight to the sink instead.
+        """
+        with self._cond:
+            if len(self._queue) >= self.max_size and not self._stopping:
+                if self.on_full == self.DROP_NEW:
+                    self.dropped += 1
+                    return False
+                elif self.on_full == self.DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self.max_size and not self._stopping:
+                        self._cond.wait()
+            if not self._stopping:
+                self._queue.append((sink, fields, trim_to))
+                self._cond.notify_all()
+                return True
+        self._write_batch([(sink, fields, trim_to)])
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                batch = [self._queue.popleft() for i in range(min(self.batch_size, len(self._queue)))]
+                self._in_process = len(batch)
+                self._cond.notify_all()
+
+            self._write_batch(batch)
+
+            with self._cond:
+                self._in_process = 0
+                self._cond.notify_all()
+
+    @staticmethod
+    def _write_batch(batch):
+        for sink, fields, trim_to in batch:
+            try:
+                sink.write(fields, trim_to)
+            except Exception:
+                log.exception('Error writing data log record')
+
+    def flush(self, timeout=None):
+        """
+        waits until all queued records have been written, returns False if the timeout was reached first.
+
+        if the writer thread is not running, the queued records are written by the calling thread.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+                self._cond.notify_all()
+            self._write_batch(batch)
+            return True
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._in_process, timeout)
+
+    def stop(self, timeout=None):
+        """
+        writes any remaining records and stops the writer thread.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        atexit.unregister(self.stop)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __repr__(self):
+        return 'DataLogWriter: %s queued, %s dropped' % (len(self._queue), self.dropped)
+
+
+_session_counter = count(1)
+_session_prefix = uuid4().hex[:12]
+
+
+def _reset_session_prefix():
+    global _session_prefix
+    _session_prefix = uuid4().hex[:12]
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_session_prefix)
+
+
+def new_session_id():
+    """
+    returns a new session id, made from a random per process prefix and a counter.  (much cheaper than a uuid1)
+    """
+    return '%s-%x' % (_session_prefix, next(_session_counter))
+
+
 class DataLogger(object):
     """
+    Timing uses time.perf_counter_ns(), so durations are not affected by wall clock changes.  The wall clock is read
+    once per session (by the parent) and start times are worked out from that anchor, they are only rendered as
+    datetime strings when a text record is written.
+
+    Children only keep a weak reference to their parent, and DataLogger uses __slots__, so finished sessions are
+    freed as soon as they are no longer used.
+
     request_data:
         account,
         date,
@@ -69,60 +312,93 @@ class DataLogger(object):
         response_headers,
         is_error,
     """
-    def __init__(self, account, url, method, request_type='Unk', data=None, parent=None, retry_num=-1, trim_to=1000):
+    __slots__ = ('account', 'url', '_parent', 'method', 'request_data', 'retry_delta_sec', 'finished',
+                 'last_child_end', 'request_type', 'trim_to', 'writer', 'sink', 'session_id', 'is_parent',
+                 'retry_num', '_clock_anchor', 'start_ns', 'sampler', '__weakref__')
+
+    def __init__(self, account, url, method, request_type='Unk', data=None, parent=None, retry_num=-1, trim_to=1000,
+                 writer=None, sink=None, sampler=None):
+        """
+        @param writer: a DataLogWriter, if passed, records are queued and written by the writer thread instead of
+            being written during end().  (children use the parents writer if not passed)
+        @param sink: the sink the records are written to, defaults to the text sink that writes to the data_log
+            logger.  (children use the parents sink if not passed)
+        @param sampler: a LogSampler, if passed, it decides which records are written.
+            (children use the parents sampler if not passed)
+        """
         self.account = account
         self.url = url
-        self.parent = parent
+        if parent is None:
+            self._parent = None
+        else:
+            self._parent = weakref.ref(parent)
         self.method = method
         self.request_data = data
         self.retry_delta_sec = None
         self.finished = False
+        # perf_counter_ns() value of the last child end.
         self.last_child_end = None
         self.request_type = request_type
         self.trim_to = trim_to
+        if writer is None and parent is not None:
+            writer = parent.writer
+        self.writer = writer
+        if sink is None:
+            if parent is not None:
+                sink = parent.sink
+            else:
+                sink = TEXT_SINK
+        self.sink = sink
+        if sampler is None and parent is not None:
+            sampler = parent.sampler
+        self.sampler = sampler
         if parent is None:
-            self.session_id = uuid1()
+            self.session_id = new_session_id()
             self.is_parent = True
             self.retry_num = -1
+            self._clock_anchor = (time(), perf_counter_ns())
         else:
             self.session_id = parent.session_id
             self.is_parent = False
             self.retry_num = retry_num
+            self._clock_anchor = parent._clock_anchor
             if parent.last_child_end is None:
                 self.retry_delta_sec = 0
             else:
-                self.retry_delta_sec = get_now() - parent.last_child_end
-                self.retry_delta_sec = self.retry_delta_sec.total_seconds()
-        self.start_time = get_now()
+                self.retry_delta_sec = (perf_counter_ns() - parent.last_child_end) / 1e9
+        self.start_ns = perf_counter_ns()
+
+    @property
+    def parent(self):
+        if self._parent is None:
+            return None
+        return self._parent()
+
+    @property
+    def start_epoch(self):
+        anchor_time, anchor_ns = self._clock_anchor
+        return anchor_time + (self.start_ns - anchor_ns) / 1e9
+
+    @property
+    def start_time(self):
+        return datetime.fromtimestamp(self.start_epoch)
 
     def make_child(self, url, method, data=None):
         return DataLogger(account=self.account, url=url, method=method, data=data, parent=self, request_type=self.request_type,
                           retry_num=self.retry_num+1)
 
     def quote(self, text_in):
-        if not isinstance(text_in, str):
-            text_in = repr(text_in)
-        if text_in and text_in[0] == '"' and text_in[-1] == '"':
-            text_in = text_in[1:-1]
-        if '"' in text_in:
-            text_in = text_in.replace('"', "'")
-        if '\n' in text_in:
-            text_in = text_in.replace('\n', ' - ')
-        if '|' in text_in:
-            text_in = text_in.replace('|', ':')
-
-        text_in = text_in[:self.trim_to]
-
-        return text_in
+        return quote(text_in, self.trim_to)
 
     def end(self, response_code=None, response_text=None, response_headers=None, response_size=None):
         if self.finished:
             return
         self.finished = True
-        if self.parent is not None:
-            self.parent.last_child_end = get_now()
-        response_time = get_now() - self.start_time
-        response_time = response_time.total_seconds()
+        end_ns = perf_counter_ns()
+        parent = self.parent
+        if parent is not None:
+            parent.last_child_end = end_ns
+        response_time = (end_ns - self.start_ns) / 1e9
         is_error = response_code != 200
 
         if self.is_parent:
@@ -130,24 +406,24 @@ class DataLogger(object):
         else:
             parent_child = 'child'
 
-        tmp_ret_l = [
-            self.quote(self.account),
-            str(self.start_time),
-            self.quote(parent_child),
-            self.quote(str(self.session_id)),
-            self.quote(self.request_type),
-            self.quote(self.url),
-            self.quote(self.method),
-            str(self.retry_num),
-            str(self.retry_delta_sec),
-            self.quote(self.request_data),
-            self.quote(response_code),
-            str(response_size),
-            self.quote(response_time),
-            self.quote(response_text),
-            self.quote(response_headers),
-            self.quote(is_error),
-        ]
+        fields = (
+            self.account,
+            self.start_epoch,
+            parent_child,
+            self.session_id,
+            self.request_type,
+            self.url,
+            self.method,
+            self.retry_num,
+            self.retry_delta_sec,
+            self.request_data,
+            response_code,
+            response_size,
+            response_time,
+            response_text,
+            response_headers,
+            is_error,
+        )
 
         """
         tmp_ret_d = dict(
@@ -170,13 +446,21 @@ class DataLogger(object):
         """
         # data_log.info('data', extra=tmp_ret_d)
 
-        tmp_ret_l = '|'.join(tmp_ret_l)
-        data_log.info(tmp_ret_l)
-        log.debug(tmp_ret_l)
+        if self.sampler is None:
+            records = (fields,)
+        else:
+            records = self.sampler.sample_record(fields, self.session_id, self.is_parent, is_error)
+
+        tmp_ret_l = None
+        for rec in records:
+            if self.writer is not None:
+                self.writer.put(rec, self.trim_to, self.sink)
+            else:
+                tmp_ret_l = self.sink.write(rec, self.trim_to)
         return tmp_ret_l
 
     def __enter__(self):
-        self.start_time = get_now()
+        self.start_ns = perf_counter_ns()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
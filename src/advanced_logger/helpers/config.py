@@ -1,12 +1,12 @@
-
-
+from .formating_helper import OBJ_FORMAT_REPR, StrFormatter, ReprFormatter, PPFormatter, JsonFormatter, \
+    obj_formatters
 
 
 CONFIG_OPTIONS = dict(
     obj_formatters = None,
     allow_multiline_logging = True,
     default_indent_size = 4,
-    default_object_decoder = OBJ_FORMAT_REPR,
+    default_object_formatter = OBJ_FORMAT_REPR,
     json_decoder = None,
     json_kwargs = None,
     use_global_timers = False,
@@ -19,7 +19,7 @@ class GlobalConfig(object):
     obj_formatters = None
     allow_multiline_logging = True
     default_indent_size = 4
-    default_object_formatter = 'xxx'
+    default_object_formatter = OBJ_FORMAT_REPR
     json_decoder = None
     json_kwargs = None
     use_global_timers = False
@@ -31,6 +31,8 @@ class GlobalConfig(object):
         self.set_options(CONFIG_OPTIONS)
         self.set_options(kwargs)
         self.formatters = {}
+        for f in (StrFormatter(), ReprFormatter(), PPFormatter(), JsonFormatter()):
+            self.add_formatter(f)
         if formatters:
             for f in formatters:
                 self.add_formatter(f)
@@ -41,9 +43,20 @@ class GlobalConfig(object):
                 setattr(self, f, v)
 
     def add_formatter(self, formatter, key=None):
+        """
+        adds a formatter by key, if the formatter has "types", it is also registered for them in obj_formatters.
+        """
         if key is None:
             key = formatter.key
         self.formatters[key] = formatter
+        obj_formatters.add_formatter(formatter)
+
+    def register_type_formatter(self, obj_type, formatter):
+        """
+        registers a formatter (or function) used by pretty_print_output and the logging mixins for obj_type and its
+        subclasses.
+        """
+        return obj_formatters.register(obj_type, formatter)
 
     def get_formatter(self, key):
         return self.formatters.get(key, self.formatters[self.default_object_formatter])
@@ -1,6 +1,16 @@
-import textwrap
+import heapq
+import json
+import re
+import reprlib
+from abc import ABCMeta, get_cache_token
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import islice
+from weakref import WeakKeyDictionary
 
-__all__ = ['pretty_print_output', 'pp', 'ppl']
+__all__ = ['pretty_print_output', 'iter_pretty_print_output', 'pph', 'ppl', 'ObjFormatterBase', 'StrFormatter',
+           'ReprFormatter', 'PPFormatter', 'JsonFormatter', 'FuncFormatter', 'ObjFormatterRegistry', 'FormattedObj',
+           'obj_formatters']
 
 
 OBJ_FORMAT_STR = 'str'
@@ -10,48 +20,240 @@ OBJ_FORMAT_JSON = 'json'
 
 
 
+# values of these types are always rendered as a single "repr()" line.
+_PP_REPR_TYPES = frozenset((int, float, bool, complex, type(None)))
+_PP_NOT_SCALAR = object()
+
+
+_RECURSION_REPRS = {list: '[...]', dict: '{...}'}
+
+
+class _BoundedRepr(reprlib.Repr):
+    """
+    reprlib.Repr that stops adding values once max_chars characters have been used, so the cost of the repr of
+    a large container depends on max_chars, not on the size of the container.
+    """
+
+    def __init__(self, max_chars):
+        super().__init__()
+        self._remaining = max_chars
+        # the ids of the containers being formatted, (reprlib does not catch self referencing structures)
+        self._active = set()
+        # every value (or level) shown takes at least 1 character, so with these limits only the char budget ends
+        # up truncating the output.
+        limit = max(max_chars, 10)
+        self.maxlevel = limit
+        self.maxtuple = self.maxlist = self.maxarray = self.maxdict = limit
+        self.maxset = self.maxfrozenset = self.maxdeque = limit
+        self.maxstring = self.maxlong = self.maxother = limit
+
+    def repr1(self, x, level):
+        if self._remaining <= 0:
+            return self.fillvalue
+        obj_id = id(x)
+        if obj_id in self._active:
+            # the same as repr() shows a self referencing list / dict
+            return _RECURSION_REPRS.get(type(x), self.fillvalue)
+        remaining = self._remaining
+        self._active.add(obj_id)
+        try:
+            tmp_ret = super().repr1(x, level)
+        finally:
+            self._active.discard(obj_id)
+        # the values in x were already counted, so this only counts the characters added around them.
+        self._remaining = remaining - len(tmp_ret)
+        return tmp_ret
+
+    # the base class keeps the start and end of long strings, these keep the start, (the output is cut from the end
+    # once the budget is used)
+    def repr_str(self, x, level):
+        if len(x) <= self.maxstring:
+            return repr(x)
+        return repr(x[:self.maxstring])[:-1] + self.fillvalue
+
+    repr_bytes = repr_str
+
+    def repr_bytearray(self, x, level):
+        return 'bytearray(%s)' % self.repr_bytes(bytes(x[:self.maxstring + 1]), level)
+
+    # the base class sorts dicts and sets before taking the first values, these use the first values as is.
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{' + self.fillvalue + '}'
+        pieces = []
+        for key, value in islice(x.items(), self.maxdict):
+            pieces.append('%s: %s' % (self.repr1(key, level - 1), self.repr1(value, level - 1)))
+        if len(x) > self.maxdict:
+            pieces.append(self.fillvalue)
+        return '{%s}' % ', '.join(pieces)
+
+    def repr_set(self, x, level):
+        if not x:
+            return 'set()'
+        return self._repr_iterable(x, level, '{', '}', self.maxset)
+
+    def repr_frozenset(self, x, level):
+        if not x:
+            return 'frozenset()'
+        return self._repr_iterable(x, level, 'frozenset({', '})', self.maxfrozenset)
+
+
+def _pp_repr(value, char_budget):
+    """
+    returns repr(value), limited to about the number of characters left in char_budget (if passed)
+    """
+    if char_budget is None:
+        return repr(value)
+    return _BoundedRepr(max(char_budget[0], 0) + 1).repr(value)
+
+
+def _pp_trim(text, char_budget):
+    # returns the part of text that can still be output, (+1 so the output is still seen as over the max)
+    if char_budget is None or len(text) <= char_budget[0]:
+        return text
+    return text[:max(char_budget[0], 0) + 1]
+
+
+def _pp_scalar_line(value, filter_none, filter_empty, repr_string, char_budget=None):
+    """
+    returns the line for a scalar value (None if it is filtered out), or _PP_NOT_SCALAR if the value needs the
+    general renderer.
+    """
+    value_type = type(value)
+    if value_type is str:
+        if value == '' and filter_empty:
+            return None
+        value = _pp_trim(value, char_budget)
+        if repr_string:
+            return repr(value)
+        if '\n' in value:
+            return _PP_NOT_SCALAR
+        return value
+    if value_type in _PP_REPR_TYPES:
+        if value is None and filter_none:
+            return None
+        if obj_formatters and obj_formatters.dispatch(value_type) is not None:
+            # a registered formatter is used, the same as for a top level value
+            return _PP_NOT_SCALAR
+        return repr(value)
+    return _PP_NOT_SCALAR
+
+
 def _pp(data_in, align_sep=True, sep=' = ', line_len=None, min_line_len=50, max_values=50, sort_keys=True,
         keys_as_sections=False, filter_none=True, sort_values=False, list_bullet='- ', repr_string=False,
         filter_empty=True, key_lookup_dict=None, recurse_level=3, line_1_prefix=''):
-    tmp_ret = []
+    return list(_iter_pp(data_in, align_sep=align_sep, sep=sep, line_len=line_len, min_line_len=min_line_len,
+                         max_values=max_values, sort_keys=sort_keys, keys_as_sections=keys_as_sections,
+                         filter_none=filter_none, sort_values=sort_values, list_bullet=list_bullet,
+                         repr_string=repr_string, filter_empty=filter_empty, key_lookup_dict=key_lookup_dict,
+                         recurse_level=recurse_level, line_1_prefix=line_1_prefix))
+
+
+def _iter_pp(data_in, align_sep=True, sep=' = ', line_len=None, min_line_len=50, max_values=50, sort_keys=True,
+             keys_as_sections=False, filter_none=True, sort_values=False, list_bullet='- ', repr_string=False,
+             filter_empty=True, key_lookup_dict=None, recurse_level=3, line_1_prefix='', parent_ids=None,
+             char_budget=None):
+    """
+    generator version of _pp, yields the lines one at a time as they are formatted.
+
+    @param parent_ids: the ids of the containers being formatted above this one, used to catch self referencing
+        structures.
+    @param char_budget: a one item list with the number of characters still allowed in the output, (kept up to date
+        by iter_pretty_print_output) used to limit the size of the reprs and strings formatted.
+    """
     line_prefix = ''.rjust(len(line_1_prefix), ' ')
 
     if line_len:
         line_len = line_len - len(line_1_prefix)
         line_len = max(line_len, min_line_len)
 
+    if parent_ids is None:
+        parent_ids = set()
+    obj_id = id(data_in)
+    is_container = isinstance(data_in, dict) or (hasattr(data_in, '__iter__') and not isinstance(data_in, str))
+
+    if is_container and obj_id in parent_ids:
+        lines = ('<Recursion on %s with id=%s>' % (type(data_in).__name__, obj_id),)
+        is_container = False
+    else:
+        lines = _iter_pp_lines(data_in, align_sep=align_sep, sep=sep, line_len=line_len, min_line_len=min_line_len,
+                               max_values=max_values, sort_keys=sort_keys, keys_as_sections=keys_as_sections,
+                               filter_none=filter_none, sort_values=sort_values, list_bullet=list_bullet,
+                               repr_string=repr_string, filter_empty=filter_empty, key_lookup_dict=key_lookup_dict,
+                               recurse_level=recurse_level, parent_ids=parent_ids, char_budget=char_budget)
+
+    if is_container:
+        parent_ids.add(obj_id)
+    try:
+        first_line = True
+        for l in lines:
+            if line_len:
+                if len(l) > line_len and not l.endswith('[...]'):
+                    l = l[:line_len - 6] + ' [...]'
+
+            if first_line:
+                first_line = False
+                yield line_1_prefix + l
+            else:
+                yield line_prefix + l
+    finally:
+        if is_container:
+            parent_ids.discard(obj_id)
+
+
+def _iter_pp_lines(data_in, align_sep, sep, line_len, min_line_len, max_values, sort_keys, keys_as_sections,
+                   filter_none, sort_values, list_bullet, repr_string, filter_empty, key_lookup_dict, recurse_level,
+                   parent_ids, char_budget=None):
+    """
+    yields the lines for data_in, without the line prefix.
+    """
+    if obj_formatters:
+        formatter = obj_formatters.dispatch(type(data_in))
+    else:
+        formatter = None
+
     if data_in is None and filter_none:
-        return []
+        return
 
     elif isinstance(data_in, str):
         if data_in == '' and filter_empty:
-            return []
+            return
+        data_in = _pp_trim(data_in, char_budget)
         if repr_string:
             data_in = repr(data_in)
         if '\n' in data_in:
-            data_in = data_in.splitlines(keepends=False)
-            tmp_ret.extend(data_in)
+            yield from data_in.splitlines(keepends=False)
+        else:
+            yield data_in
+    elif formatter is not None:
+        data_in = _pp_trim(formatter.format(data_in), char_budget)
+        if '\n' in data_in:
+            yield from data_in.splitlines(keepends=False)
         else:
-            tmp_ret.append(data_in)
+            yield data_in
     elif isinstance(data_in, dict):
         if recurse_level <= 0:
-            tmp_ret.append(repr(data_in))
+            yield _pp_repr(data_in, char_budget)
         elif not data_in:
-            if filter_empty:
-                return []
-            else:
-                return [line_1_prefix + '{}']
+            if not filter_empty:
+                yield '{}'
         else:
-            keys = list(data_in.keys())
-            if sort_keys:
-                keys.sort()
             extra_val = None
             max_key_len = 0
 
-            if max_values and len(keys) > max_values:
-                extra_val = f'[+{len(keys) - max_values} more]'
-
-                keys = keys[:max_values]
+            if max_values and len(data_in) > max_values:
+                extra_val = f'[+{len(data_in) - max_values} more]'
+                if sort_keys:
+                    # only the keys that are shown need to be sorted
+                    keys = heapq.nsmallest(max_values, data_in)
+                else:
+                    keys = list(data_in.keys())[:max_values]
+            else:
+                keys = list(data_in.keys())
+                if sort_keys:
+                    keys.sort()
 
             if align_sep and not keys_as_sections:
                 if key_lookup_dict:
@@ -68,6 +270,9 @@ def _pp(data_in, align_sep=True, sep=' = ', line_len=None, min_line_len=50, max_
             if extra_val:
                 max_key_len = max(max_key_len, len(extra_val))
 
+            # {len(line_1_prefix): line_len} for scalar values
+            value_line_lens = {}
+
             for key in keys:
                 value = data_in[key]
                 tmp_sec_key = None
@@ -79,69 +284,97 @@ def _pp(data_in, align_sep=True, sep=' = ', line_len=None, min_line_len=50, max_
                 else:
                     l1 = key.rjust(max_key_len, ' ') + sep
 
-                value = _pp(value, align_sep=align_sep, sep=sep, line_len=line_len, min_line_len=min_line_len,
-                            max_values=max_values, sort_keys=sort_keys, list_bullet=list_bullet,
-                            repr_string=repr_string,
-                            sort_values=sort_values, keys_as_sections=keys_as_sections, filter_none=filter_none,
-                            filter_empty=filter_empty, key_lookup_dict=key_lookup_dict,
-                            recurse_level=recurse_level - 1,
-                            line_1_prefix=l1
-                            )
-                if value and tmp_sec_key:
-                    tmp_ret.append(tmp_sec_key)
-
-                tmp_ret.extend(value)
+                    # fast path for scalar values, (the same output as _iter_pp, without the recursive call)
+                    value_line = _pp_scalar_line(value, filter_none, filter_empty, repr_string, char_budget)
+                    if value_line is None:
+                        continue
+                    if value_line is not _PP_NOT_SCALAR:
+                        if line_len:
+                            try:
+                                value_line_len = value_line_lens[len(l1)]
+                            except KeyError:
+                                value_line_len = value_line_lens[len(l1)] = max(line_len - len(l1), min_line_len)
+                            if value_line_len and len(value_line) > value_line_len and \
+                                    not value_line.endswith('[...]'):
+                                value_line = value_line[:value_line_len - 6] + ' [...]'
+                        yield l1 + value_line
+                        continue
+
+                value = _iter_pp(value, align_sep=align_sep, sep=sep, line_len=line_len, min_line_len=min_line_len,
+                                 max_values=max_values, sort_keys=sort_keys, list_bullet=list_bullet,
+                                 repr_string=repr_string,
+                                 sort_values=sort_values, keys_as_sections=keys_as_sections, filter_none=filter_none,
+                                 filter_empty=filter_empty, key_lookup_dict=key_lookup_dict,
+                                 recurse_level=recurse_level - 1,
+                                 line_1_prefix=l1,
+                                 parent_ids=parent_ids,
+                                 char_budget=char_budget,
+                                 )
+                if tmp_sec_key:
+                    # the section key is only included if the value has any lines.
+                    value_line = next(value, None)
+                    if value_line is None:
+                        continue
+                    yield tmp_sec_key
+                    yield value_line
+
+                yield from value
             if extra_val:
-                tmp_ret.append(extra_val)
+                yield extra_val
 
     elif hasattr(data_in, '__iter__'):
         line_count = 0
         if recurse_level <= 0:
-            tmp_ret.append(repr(data_in))
+            yield _pp_repr(data_in, char_budget)
         elif not data_in:
-            if filter_empty:
-                return []
-            else:
-                return [line_1_prefix + repr(data_in)]
+            if not filter_empty:
+                yield repr(data_in)
         else:
+            values = data_in
             if sort_values:
+                # sorted into a new list, (the passed values are not changed)
                 try:
-                    data_in.sort()
+                    if max_values is not None and len(data_in) > max_values:
+                        # only the values that are shown need to be sorted, (+1 so the "more" line is still added)
+                        values = heapq.nsmallest(max_values + 1, data_in)
+                    else:
+                        values = sorted(data_in)
                 except Exception:
                     pass
-            extra_val = None
-            extra_count = len(data_in) - max_values
-            for value in data_in:
+            if line_len:
+                value_line_len = max(line_len - len(list_bullet), min_line_len)
+            else:
+                value_line_len = None
+            for value in values:
                 line_count += 1
                 if max_values is not None and line_count > max_values:
-                    tmp_ret.append(f'[+{extra_count} more]')
+                    yield f'[+{len(data_in) - max_values} more]'
                     break
-                value = _pp(value, align_sep=align_sep, sep=sep, line_len=line_len, min_line_len=min_line_len,
-                            max_values=max_values, sort_keys=sort_keys, list_bullet=list_bullet,
-                            repr_string=repr_string,
-                            sort_values=sort_values, keys_as_sections=keys_as_sections, filter_none=filter_none,
-                            filter_empty=filter_empty, key_lookup_dict=key_lookup_dict,
-                            recurse_level=recurse_level - 1,
-                            line_1_prefix=list_bullet,
-                            )
-                tmp_ret.extend(value)
 
-    else:
-        tmp_ret.append(repr(data_in))
-
-    tmp_ret_2 = []
-
-    for l in tmp_ret:
-        if line_len:
-            if len(l) > line_len and not l.endswith('[...]'):
-                l = l[:line_len - 6] + ' [...]'
-
-        if not tmp_ret_2:
-            tmp_ret_2.append(line_1_prefix + l)
-        else:
-            tmp_ret_2.append(line_prefix + l)
+                # fast path for scalar values, (the same output as _iter_pp, without the recursive call)
+                value_line = _pp_scalar_line(value, filter_none, filter_empty, repr_string, char_budget)
+                if value_line is None:
+                    continue
+                if value_line is not _PP_NOT_SCALAR:
+                    if value_line_len and len(value_line) > value_line_len and not value_line.endswith('[...]'):
+                        value_line = value_line[:value_line_len - 6] + ' [...]'
+                    yield list_bullet + value_line
+                    continue
+
+                yield from _iter_pp(value, align_sep=align_sep, sep=sep, line_len=line_len, min_line_len=min_line_len,
+                                    max_values=max_values, sort_keys=sort_keys, list_bullet=list_bullet,
+                                    repr_string=repr_string,
+                                    sort_values=sort_values, keys_as_sections=keys_as_sections,
+                                    filter_none=filter_none, filter_empty=filter_empty,
+                                    key_lookup_dict=key_lookup_dict,
+                                    recurse_level=recurse_level - 1,
+                                    line_1_prefix=list_bullet,
+                                    parent_ids=parent_ids,
+                                    char_budget=char_budget,
+                                    )
 
-    return tmp_ret_2
+    else:
+        yield _pp_repr(data_in, char_budget)
 
 
 def pretty_print_output(data_in, header=None, footer=None, align_sep=True, sep=' = ', line_len=None,
@@ -149,7 +382,8 @@ def pretty_print_output(data_in, header=None, footer=None, align_sep=True, sep='
                         max_values=50, sort_keys=True, keys_as_sections=False, list_bullet='- ', repr_string=False,
                         filter_none=True, sort_values=False, filter_empty=True, key_lookup_dict=None,
                         recurse_level=3,
-                        value_if_empty='No Data', indent='', ret_as_list=False, data_indent=''):
+                        value_if_empty='No Data', indent='', ret_as_list=False, data_indent='', max_lines=None,
+                        max_chars=None):
 
     """
     takes dict and outputs it as such:
@@ -192,52 +426,99 @@ def pretty_print_output(data_in, header=None, footer=None, align_sep=True, sep='
     @param indent: a string that is pre-pended to each line.
     @param data_indent: a string that is pre-pended to each line of the data. (note this is additive to the indent field)
     @param ret_as_list: T/F should the system return a list of lines instead of a string.
+    @param max_lines: the max number of data lines, (None = no max)
+    @param max_chars: the max number of characters in the data lines, (None = no max)
+        once either max is passed, the data is no longer walked and "[output truncated]" is added.
     @return:
     """
-
-    if not data_in:
-        tmp_data = [value_if_empty]
+    tmp_ret = iter_pretty_print_output(data_in, header=header, footer=footer, align_sep=align_sep, sep=sep,
+                                       line_len=line_len, min_line_len=min_line_len, max_values=max_values,
+                                       sort_keys=sort_keys, keys_as_sections=keys_as_sections,
+                                       list_bullet=list_bullet, repr_string=repr_string, filter_none=filter_none,
+                                       sort_values=sort_values, filter_empty=filter_empty,
+                                       key_lookup_dict=key_lookup_dict, recurse_level=recurse_level,
+                                       value_if_empty=value_if_empty, indent=indent, data_indent=data_indent,
+                                       max_lines=max_lines, max_chars=max_chars)
+    if ret_as_list:
+        return list(tmp_ret)
     else:
-        tmp_data = _pp(data_in,
-                       align_sep=align_sep,
-                       sep=sep,
-                       line_len=line_len,
-                       min_line_len=min_line_len,
-                       max_values=max_values,
-                       sort_keys=sort_keys,
-                       keys_as_sections=keys_as_sections,
-                       list_bullet=list_bullet,
-                       filter_none=filter_none,
-                       sort_values=sort_values,
-                       filter_empty=filter_empty,
-                       key_lookup_dict=key_lookup_dict,
-                       recurse_level=recurse_level,
-                       repr_string=repr_string,
-                       line_1_prefix='')
-    tmp_data = '\n'.join(tmp_data)
-    if data_indent:
-        tmp_data = textwrap.indent(tmp_data, data_indent)
-    tmp_data = tmp_data.splitlines(keepends=False)
-
-    tmp_ret = []
+        return '\n'.join(tmp_ret)
 
+
+def _iter_split_lines(lines, indent):
+    # splits any lines with embedded line breaks and adds the indent to the non blank lines (as textwrap.indent does)
+    for line in lines:
+        if '\n' in line or '\r' in line:
+            sub_lines = line.splitlines(keepends=False)
+        else:
+            sub_lines = (line,)
+        for sub_line in sub_lines:
+            if indent and sub_line.strip():
+                sub_line = indent + sub_line
+            yield sub_line
+
+
+def iter_pretty_print_output(data_in, header=None, footer=None, align_sep=True, sep=' = ', line_len=None,
+                             min_line_len=50, max_values=50, sort_keys=True, keys_as_sections=False, list_bullet='- ',
+                             repr_string=False, filter_none=True, sort_values=False, filter_empty=True,
+                             key_lookup_dict=None, recurse_level=3, value_if_empty='No Data', indent='',
+                             data_indent='', max_lines=None, max_chars=None):
+    """
+    generator version of pretty_print_output, yields the output lines one at a time as they are formatted so large
+    structures can be written to a file or log without building the whole output in memory.
+
+    (see pretty_print_output for the parameters)
+    """
     if header:
-        tmp_ret.append(str(header))
-    if tmp_data:
-        tmp_ret.extend(tmp_data)
-    else:
-        tmp_ret.append(value_if_empty)
-    if footer:
-        tmp_ret.append(str(footer))
+        yield from _iter_split_lines((str(header),), indent)
 
-    tmp_ret = '\n'.join(tmp_ret)
-    if indent:
-        tmp_ret = textwrap.indent(tmp_ret, indent)
+    # the number of characters left for the data lines, passed down so large values are only partly formatted.
+    char_budget = None if max_chars is None else [max_chars]
 
-    if ret_as_list:
-        return tmp_ret.splitlines(keepends=False)
+    if obj_formatters.dispatch(type(data_in)) is None and not data_in:
+        tmp_data = (value_if_empty,)
     else:
-        return tmp_ret
+        tmp_data = _iter_pp(data_in,
+                            align_sep=align_sep,
+                            sep=sep,
+                            line_len=line_len,
+                            min_line_len=min_line_len,
+                            max_values=max_values,
+                            sort_keys=sort_keys,
+                            keys_as_sections=keys_as_sections,
+                            list_bullet=list_bullet,
+                            filter_none=filter_none,
+                            sort_values=sort_values,
+                            filter_empty=filter_empty,
+                            key_lookup_dict=key_lookup_dict,
+                            recurse_level=recurse_level,
+                            repr_string=repr_string,
+                            line_1_prefix='',
+                            char_budget=char_budget)
+
+    has_data = False
+    line_count = 0
+    char_count = 0
+    # data_indent and indent are both only added to non blank lines, so they can be added in one pass.
+    data_lines = _iter_split_lines(tmp_data, indent + data_indent)
+    for line in data_lines:
+        has_data = True
+        line_count += 1
+        char_count += len(line) + 1
+        if char_budget is not None:
+            char_budget[0] = max_chars - char_count
+        if (max_lines is not None and line_count > max_lines) or (max_chars is not None and char_count > max_chars):
+            # closing the generators stops the data from being walked any further.
+            data_lines.close()
+            yield from _iter_split_lines(('[output truncated]',), indent)
+            break
+        yield line
+    if not has_data:
+        yield from _iter_split_lines((value_if_empty,), indent)
+
+    if footer:
+        yield from _iter_split_lines((str(footer),), indent)
+
 
 def pph(*args, **kwargs):
     return pretty_print_output(*args, **kwargs)
@@ -250,4 +531,283 @@ def ppl(*args, **kwargs):
 
 
 class ObjFormatterBase(object):
+    """
+    Base class for object formatters.
+
+    key: the name the formatter is added to GlobalConfig.formatters under.
+    types: the types the formatter is registered for by ObjFormatterRegistry.add_formatter(), (subclasses of them
+        use the formatter too, unless a formatter is registered for a closer type)
+    """
+    key = None
+    types = ()
+
+    def format(self, obj):
+        raise NotImplementedError
+
+    def __call__(self, obj):
+        return self.format(obj)
+
+    def __repr__(self):
+        return '%s: %s' % (self.__class__.__name__, self.key)
+
+
+class StrFormatter(ObjFormatterBase):
+    key = OBJ_FORMAT_STR
+
+    def format(self, obj):
+        return str(obj)
+
+
+class ReprFormatter(ObjFormatterBase):
+    key = OBJ_FORMAT_REPR
+
+    def format(self, obj):
+        return repr(obj)
+
+
+class PPFormatter(ObjFormatterBase):
+    key = OBJ_FORMAT_PP
+
+    def __init__(self, **kwargs):
+        """
+        @param kwargs: passed to pretty_print_output
+        """
+        self.kwargs = kwargs
+
+    def format(self, obj):
+        return pretty_print_output(obj, **self.kwargs)
+
+
+class JsonFormatter(ObjFormatterBase):
+    key = OBJ_FORMAT_JSON
+
+    def __init__(self, **kwargs):
+        """
+        @param kwargs: passed to json.dumps, (default= defaults to str)
+        """
+        kwargs.setdefault('default', str)
+        self.kwargs = kwargs
+
+    def format(self, obj):
+        return json.dumps(obj, **self.kwargs)
+
+
+class FuncFormatter(ObjFormatterBase):
+    """
+    formatter using a function that takes the object and returns a string.
+    """
+
+    def __init__(self, func, key=None):
+        self.func = func
+        self.key = key
+
+    def format(self, obj):
+        return self.func(obj)
+
+
+class ObjFormatterRegistry(object):
+    """
+    Formatters by object type.
+
+    The formatter for a type is found the same way functools.singledispatch finds an implementation, the closest
+    registered class in the type's MRO is used, then any registered abstract base class the type is a subclass of.
+    The result is cached per type, so after the first lookup for a type it is a single dict lookup.
+
+    usage:
+        obj_formatters.register(MyModel, lambda obj: 'MyModel: %s' % obj.pk)
+
+        @obj_formatters.register(numpy.ndarray)
+        def format_array(obj):
+            return 'array%s %s' % (obj.shape, obj.dtype)
+
+    pretty_print_output uses the formatters for values at every level, (dict values and list items included)
+    except for str values.
+    """
+
+    def __init__(self, formatters=None):
+        self._registry = {}
+        self._cache = WeakKeyDictionary()
+        self._cache_token = None
+        if formatters:
+            for f in formatters:
+                self.add_formatter(f)
+
+    def register(self, obj_type, formatter=None):
+        """
+        registers a formatter (an ObjFormatterBase or a function) for a type.  If formatter is not passed, returns a
+        decorator.
+        """
+        if formatter is None:
+            def _register(func):
+                self.register(obj_type, func)
+                return func
+            return _register
+
+        if not isinstance(formatter, ObjFormatterBase):
+            formatter = FuncFormatter(formatter)
+        self._registry[obj_type] = formatter
+        if self._cache_token is None and isinstance(obj_type, ABCMeta):
+            self._cache_token = get_cache_token()
+        self._cache.clear()
+        return formatter
+
+    def unregister(self, obj_type):
+        self._registry.pop(obj_type, None)
+        self._cache.clear()
+
+    def add_formatter(self, formatter):
+        """
+        registers the formatter for each of the types in formatter.types
+        """
+        for obj_type in formatter.types:
+            self.register(obj_type, formatter)
+
+    def _find_formatter(self, obj_type):
+        registry = self._registry
+        for base in obj_type.__mro__:
+            try:
+                return registry[base]
+            except KeyError:
+                pass
+        for base, formatter in registry.items():
+            if isinstance(base, ABCMeta) and issubclass(obj_type, base):
+                return formatter
+        return None
+
+    def dispatch(self, obj_type):
+        """
+        returns the formatter for a type, or None if there is not one.
+        """
+        if not self._registry:
+            return None
+        if self._cache_token is not None and self._cache_token != get_cache_token():
+            # a class was registered with an abc, (this may change which formatter is used)
+            self._cache.clear()
+            self._cache_token = get_cache_token()
+        try:
+            return self._cache[obj_type]
+        except KeyError:
+            formatter = self._cache[obj_type] = self._find_formatter(obj_type)
+            return formatter
+
+    def format(self, obj):
+        """
+        formats obj with the formatter for its type, (repr() if there is not one)
+        """
+        formatter = self.dispatch(type(obj))
+        if formatter is None:
+            return repr(obj)
+        return formatter.format(obj)
+
+    def _wrap_arg(self, arg, conversion):
+        if conversion not in _STR_CONVERSIONS:
+            return arg
+        formatter = self.dispatch(type(arg))
+        if formatter is None:
+            return arg
+        return FormattedObj(arg, formatter)
+
+    def wrap_args(self, args, msg=None):
+        """
+        returns the args with any objects that have a formatter wrapped in a FormattedObj, (the args are only
+        formatted if they are used in a string)
+
+        If msg is passed, only the args used with "%s" / "%r" / "%a" are wrapped, so numeric conversions like "%.2f"
+        still get the object.  A single mapping arg (for "%(key)s" messages) has its values wrapped instead.
+        """
+        if not self._registry:
+            return args
+        if msg is None:
+            conversions = None
+            named = None
+        else:
+            conversions, named = _msg_conversions(str(msg))
+
+        if named and len(args) == 1 and isinstance(args[0], Mapping):
+            mapping = args[0]
+            tmp_ret = {key: self._wrap_arg(value, named.get(key)) for key, value in mapping.items()}
+            if any(tmp_ret[key] is not value for key, value in mapping.items()):
+                return tmp_ret,
+            return args
+
+        tmp_ret = []
+        changed = False
+        for index, arg in enumerate(args):
+            if conversions is None:
+                conversion = 's'
+            elif index < len(conversions):
+                conversion = conversions[index]
+            else:
+                conversion = None
+            wrapped = self._wrap_arg(arg, conversion)
+            if wrapped is not arg:
+                changed = True
+            tmp_ret.append(wrapped)
+        if changed:
+            return tuple(tmp_ret)
+        return args
+
+    def __bool__(self):
+        return bool(self._registry)
+
+    def __len__(self):
+        return len(self._registry)
+
+    def __contains__(self, obj_type):
+        return obj_type in self._registry
+
+    def __repr__(self):
+        return 'ObjFormatterRegistry: %s types' % len(self._registry)
+
+
+# %[(key)][flags][width][.precision][length]type, ("*" width / precision use an arg)
+_FORMAT_SPEC_RE = re.compile(r'%(?:\((?P<key>[^)]*)\))?[#0\- +]*(?P<width>\*|\d+)?(?:\.(?P<prec>\*|\d*))?[hlL]?'
+                             r'(?P<type>[diouxXeEfFgGcrsa%])')
+_STR_CONVERSIONS = frozenset('sra')
+
+
+@lru_cache(maxsize=1024)
+def _msg_conversions(msg):
+    """
+    returns the conversion type used for each positional arg of a "%" format string, and a dict of the conversion
+    types used for each key.  ("*" widths / precisions are counted as "*")
+    """
+    conversions = []
+    named = {}
+    for match in _FORMAT_SPEC_RE.finditer(msg):
+        conversion = match.group('type')
+        if conversion == '%':
+            continue
+        if match.group('key') is not None:
+            # a key used with more than one conversion is only wrapped if all of them are string conversions.
+            if named.get(match.group('key'), conversion) in _STR_CONVERSIONS:
+                named[match.group('key')] = conversion
+            continue
+        if match.group('width') == '*':
+            conversions.append('*')
+        if match.group('prec') == '*':
+            conversions.append('*')
+        conversions.append(conversion)
+    return tuple(conversions), named
+
+
+class FormattedObj(object):
+    """
+    wraps a log arg so it is formatted with its formatter when it is used with "%s" or "%r".
+    """
+    __slots__ = ('obj', 'formatter')
+
+    def __init__(self, obj, formatter):
+        self.obj = obj
+        self.formatter = formatter
+
+    def __str__(self):
+        return self.formatter.format(self.obj)
+
+    def __repr__(self):
+        return self.formatter.format(self.obj)
+
+
+# the default registry, used by _pp / pretty_print_output and the logging mixins.
+obj_formatters = ObjFormatterRegistry()
 
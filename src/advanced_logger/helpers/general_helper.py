@@ -1,91 +1,22 @@
+import sys
+from collections import UserDict
+from decimal import Decimal
+from unicodedata import normalize
 
-class IndentHelper(object):
-    def __init__(self, size=0, spaces=4, max_size=100, **kwargs):
-        self.spaces = spaces
-        self.max_size = max_size
-        self.indent = size
-        self.names = kwargs.copy()
-        self.contexts = []
-
-    def set(self, size):
-        if isinstance(size, str):
-            size = self.names[size]
-        if size > self.max_size:
-            size = self.max_size
-        elif size < 0:
-            size = 0
-        self.indent = size
-        return self
-
-    def a(self, size=1):
-        self.set(self.indent + size)
-        return self
-
-    def s(self, size=1):
-        self.set(self.indent - size)
-        return self
+_UNSET = object()
 
-    @property
-    def i(self):
-        return str(self)
-
-    def push(self, name, size=None):
-        size = size or self.indent
-        self.names[name] = size
-        return self
-
-    def pop(self, name):
-        self.set(name)
-        del self.names[name]
-        return self
 
-    def delete(self, name):
-        del self.names[name]
-        return self
-
-    def clear(self):
-        self.indent = 0
-        self.names.clear()
-
-    def __iadd__(self, other):
-        self.a(other)
-        return self
-
-    def __isub__(self, other):
-        self.s(other)
-        return self
-
-    def __str__(self):
-        return ' ' * self.spaces * self.indent
-
-    def __enter__(self):
-        self.contexts.append(self.indent)
-        self.a()
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.set(self.contexts.pop())
+def is_iterable(obj_in):
+    """
+    returns True if the object can be iterated over, (strings and bytes are not counted as iterables)
+    """
+    if isinstance(obj_in, (str, bytes)):
         return False
-
-    def __call__(self, *size, set=None):
-        if set is not None:
-            self.set(set)
-
-        if size:
-            self.a(size[0])
-        return self
-
-    def __eq__(self, other):
-        return other == self.indent
-
-    def __int__(self):
-        return self.indent
-
-    def __contains__(self, item):
-        return item in self.names
-
-    def __repr__(self):
-        return 'IndentHelper: size: %s, saves: %r' % (self.indent, self.names)
-
+    try:
+        iter(obj_in)
+    except TypeError:
+        return False
+    return True
 
 class LazyFunc(object):
     def __init__(self, data, *funcs):
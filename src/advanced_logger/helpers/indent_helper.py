@@ -0,0 +1,252 @@
+import sys
+import threading
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+__all__ = ['IndentHelper', 'ContextIndentHelper']
+
+
+class IndentHelper(object):
+    def __init__(self, size=0, spaces=4, max_size=100, **kwargs):
+        self._spaces = spaces
+        self._max_size = max_size
+        self._pad_strs = None
+        self._indent_strs = None
+        self._build_indent_strs()
+        self.names = kwargs.copy()
+        self.contexts = []
+        self.indent = 0
+        self.set(size)
+
+    def _build_indent_strs(self):
+        """
+        builds the table of interned pad strings, the indent string for a level is the pad string for
+        (level * spaces), so both tables share the same string objects.
+        """
+        self._pad_strs = [sys.intern(' ' * i) for i in range(self._spaces * self._max_size + 1)]
+        self._indent_strs = self._pad_strs[::self._spaces] if self._spaces else [''] * (self._max_size + 1)
+
+    @property
+    def spaces(self):
+        return self._spaces
+
+    @spaces.setter
+    def spaces(self, value):
+        if value != self._spaces:
+            self._spaces = value
+            self._build_indent_strs()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        if value != self._max_size:
+            self._max_size = value
+            self._build_indent_strs()
+            if self.indent > value:
+                self.indent = value
+
+    def indent_str(self, size=None):
+        """
+        returns the (cached) indent string for the current indent level, or for "size" levels if passed.
+        """
+        if size is None:
+            return self._indent_strs[self.indent]
+        if size <= 0:
+            # (a negative index would count from the end of the table)
+            return ''
+        try:
+            return self._indent_strs[size]
+        except IndexError:
+            return self._indent_strs[self._max_size]
+
+    def pad(self, num_spaces):
+        """
+        returns a (cached if possible) string of "num_spaces" spaces, independent of the current indent level.
+        """
+        if num_spaces <= 0:
+            # (a negative index would count from the end of the table)
+            return ''
+        try:
+            return self._pad_strs[num_spaces]
+        except IndexError:
+            return ' ' * num_spaces
+
+    def set(self, size):
+        if isinstance(size, str):
+            size = self.names[size]
+        if size > self.max_size:
+            size = self.max_size
+        elif size < 0:
+            size = 0
+        self.indent = size
+        return self
+
+    def a(self, size=1):
+        self.set(self.indent + size)
+        return self
+
+    def s(self, size=1):
+        self.set(self.indent - size)
+        return self
+
+    @property
+    def i(self):
+        return self._indent_strs[self.indent]
+
+    def push(self, name, size=None):
+        size = size or self.indent
+        self.names[name] = size
+        return self
+
+    def pop(self, name):
+        self.set(name)
+        del self.names[name]
+        return self
+
+    def delete(self, name):
+        del self.names[name]
+        return self
+
+    def clear(self):
+        self.indent = 0
+        self.names.clear()
+
+    def __iadd__(self, other):
+        self.a(other)
+        return self
+
+    def __isub__(self, other):
+        self.s(other)
+        return self
+
+    def __str__(self):
+        return self._indent_strs[self.indent]
+
+    def __enter__(self):
+        self.contexts.append(self.indent)
+        self.a()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.set(self.contexts.pop())
+        return False
+
+    def __call__(self, *size, set=None):
+        if set is not None:
+            self.set(set)
+
+        if size:
+            self.a(size[0])
+        return self
+
+    def __eq__(self, other):
+        return other == self.indent
+
+    def __int__(self):
+        return self.indent
+
+    def __contains__(self, item):
+        return item in self.names
+
+    def __repr__(self):
+        return 'IndentHelper: size: %s, saves: %r' % (self.indent, self.names)
+
+
+class ContextIndentHelper(IndentHelper):
+    """
+    IndentHelper that keeps the indent level, named saves and context stack separately for each thread and asyncio
+    task, so concurrent requests do not interleave their indents and no locking is needed.
+
+    The state is held in a contextvars.ContextVar (or a threading.local if contextvars is not available) as an
+    immutable (indent, names, contexts) tuple that is replaced on every change.  Any thread or task that has not
+    changed the indent yet sees the state the helper was created with.
+
+    note: "names" and "contexts" should not be modified directly, use push/pop/delete/clear and the context manager.
+    """
+
+    def __init__(self, size=0, spaces=4, max_size=100, **kwargs):
+        if contextvars is not None:
+            self._var = contextvars.ContextVar('indent_helper_%s' % id(self))
+            self._local = None
+        else:
+            self._var = None
+            self._local = threading.local()
+        self._default_state = (0, {}, ())
+        super(ContextIndentHelper, self).__init__(size=size, spaces=spaces, max_size=max_size, **kwargs)
+        self._default_state = self._get_state()
+
+    def _get_state(self):
+        if self._var is not None:
+            return self._var.get(self._default_state)
+        return getattr(self._local, 'state', self._default_state)
+
+    def _set_state(self, indent, names, contexts):
+        if self._var is not None:
+            self._var.set((indent, names, contexts))
+        else:
+            self._local.state = (indent, names, contexts)
+
+    @property
+    def indent(self):
+        return self._get_state()[0]
+
+    @indent.setter
+    def indent(self, value):
+        state = self._get_state()
+        self._set_state(value, state[1], state[2])
+
+    @property
+    def names(self):
+        return self._get_state()[1]
+
+    @names.setter
+    def names(self, value):
+        state = self._get_state()
+        self._set_state(state[0], dict(value), state[2])
+
+    @property
+    def contexts(self):
+        return self._get_state()[2]
+
+    @contexts.setter
+    def contexts(self, value):
+        state = self._get_state()
+        self._set_state(state[0], state[1], tuple(value))
+
+    def push(self, name, size=None):
+        indent, names, contexts = self._get_state()
+        names = names.copy()
+        names[name] = size or indent
+        self._set_state(indent, names, contexts)
+        return self
+
+    def pop(self, name):
+        self.set(name)
+        self.delete(name)
+        return self
+
+    def delete(self, name):
+        indent, names, contexts = self._get_state()
+        names = names.copy()
+        del names[name]
+        self._set_state(indent, names, contexts)
+        return self
+
+    def clear(self):
+        self._set_state(0, {}, self._get_state()[2])
+
+    def __enter__(self):
+        indent, names, contexts = self._get_state()
+        self._set_state(indent, names, contexts + (indent,))
+        self.a()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        indent, names, contexts = self._get_state()
+        self._set_state(indent, names, contexts[:-1])
+        self.set(contexts[-1])
+        return False
@@ -0,0 +1,163 @@
+"""
+Process safe log capture for LoggingRecordMixin.
+
+A SharedLogBuffer is a fixed size ring of log lines in a memory-mapped file.  It can be passed to a
+multiprocessing / ProcessPoolExecutor worker (it pickles as its filename), the worker records its logs into it, and
+the parent reads them back from the same file without the records being pickled.
+
+usage:
+    buffer = SharedLogBuffer(slots=1000)
+
+    # in the worker:
+    def run(obj, buffer):
+        obj._log_use_buffer(buffer)
+        obj.do_work()
+
+    # in the parent, once the worker is done:
+    parent_obj._log_merge_records(buffer)
+    buffer.close(unlink=True)
+    print(parent_obj._get_logs())
+
+Merging copies the lines out of the buffer, so it can be closed once it is merged.  A buffer that created its own
+temp file also deletes it when it is garbage collected.  (a closed buffer has no lines)
+
+note: each buffer should only be written by one process at a time, use one buffer per task.
+"""
+__author__ = 'strohl'
+__version__ = '0.9'
+__status__ = 'Testing'
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+__all__ = ['SharedLogBuffer']
+
+
+_MAGIC = b'ALRB'
+# magic, slot size, number of slots, padding
+_HEADER = struct.Struct('=4sIII')
+# number of records written (the ring only holds the last "slots" of them)
+_COUNT = struct.Struct('=Q')
+_COUNT_OFFSET = _HEADER.size
+_SLOTS_OFFSET = _COUNT_OFFSET + _COUNT.size
+_SLOT_LEN = struct.Struct('=I')
+
+
+class SharedLogBuffer(object):
+
+    def __init__(self, slots=1000, slot_size=512, filename=None, attach=False):
+        """
+        @param slots: the number of log lines kept, (older lines are overwritten)
+        @param slot_size: the max size in bytes of each line, (longer lines are truncated)
+        @param filename: the file used for the buffer, defaults to a new temp file.
+        @param attach: T/F attach to an existing buffer file, (slots and slot_size are read from the file)
+        """
+        # only a temp file created here is deleted when the buffer is garbage collected.
+        self._owner = filename is None
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix='adv_log_', suffix='.buf')
+            os.close(fd)
+        self.filename = filename
+        self._lock = threading.Lock()
+
+        if attach:
+            with open(filename, 'rb') as f:
+                magic, slot_size, slots, pad = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError('%s is not a shared log buffer file' % filename)
+
+        self.slots = slots
+        self.slot_size = slot_size
+        size = _SLOTS_OFFSET + slots * slot_size
+
+        self._file = open(filename, 'r+b')
+        if not attach:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        if not attach:
+            _HEADER.pack_into(self._mm, 0, _MAGIC, slot_size, slots, 0)
+            _COUNT.pack_into(self._mm, _COUNT_OFFSET, 0)
+
+    @classmethod
+    def attach(cls, filename):
+        return cls(filename=filename, attach=True)
+
+    def __reduce__(self):
+        return self.__class__.attach, (self.filename,)
+
+    @property
+    def count(self):
+        """
+        the total number of lines written, (including the ones that have been overwritten)
+        """
+        if self._mm.closed:
+            return 0
+        return _COUNT.unpack_from(self._mm, _COUNT_OFFSET)[0]
+
+    @property
+    def maxlen(self):
+        return self.slots
+
+    def append(self, rec):
+        data = str(rec).encode('utf-8')[:self.slot_size - _SLOT_LEN.size]
+        with self._lock:
+            count = self.count
+            offset = _SLOTS_OFFSET + (count % self.slots) * self.slot_size
+            _SLOT_LEN.pack_into(self._mm, offset, len(data))
+            self._mm[offset + _SLOT_LEN.size:offset + _SLOT_LEN.size + len(data)] = data
+            # the count is updated last, so a reader never sees a slot that is only partly written.
+            _COUNT.pack_into(self._mm, _COUNT_OFFSET, count + 1)
+
+    def __iter__(self):
+        count = self.count
+        if not count:
+            return
+        for index in range(max(0, count - self.slots), count):
+            offset = _SLOTS_OFFSET + (index % self.slots) * self.slot_size
+            length = _SLOT_LEN.unpack_from(self._mm, offset)[0]
+            start = offset + _SLOT_LEN.size
+            yield self._mm[start:start + length].decode('utf-8', errors='ignore')
+
+    def __len__(self):
+        return min(self.count, self.slots)
+
+    def clear(self):
+        with self._lock:
+            _COUNT.pack_into(self._mm, _COUNT_OFFSET, 0)
+
+    def get_logs(self, sep='\n'):
+        log_recs = list(self) or ['Empty Logs']
+        if sep is not None:
+            return sep.join(log_recs)
+        return log_recs
+
+    def close(self, unlink=False):
+        """
+        @param unlink: T/F delete the buffer file.  (only do this in the process that owns the buffer, once all
+            the readers and writers are done with it)
+        """
+        if not self._mm.closed:
+            self._mm.close()
+            self._file.close()
+        if unlink and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def __del__(self):
+        if getattr(self, '_mm', None) is not None:
+            try:
+                self.close(unlink=self._owner)
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(unlink=True)
+        return False
+
+    def __repr__(self):
+        return 'SharedLogBuffer: %s (%s of %s lines)' % (self.filename, len(self), self.slots)
@@ -1,11 +1,69 @@
 import logging
-from who_helpers.helpers import IndentHelper
+from collections import deque
+from weakref import WeakKeyDictionary
+from .helpers.formating_helper import iter_pretty_print_output, obj_formatters
+from .helpers.indent_helper import IndentHelper
+from .log_buffer_helper import SharedLogBuffer
+
+# mutable arg types that are copied when a LazyLogRecord is created.
+_MUTABLE_ARG_TYPES = (list, dict, set, bytearray)
+
+
+def _snapshot_arg(arg):
+    if isinstance(arg, _MUTABLE_ARG_TYPES):
+        return arg.copy()
+    return arg
+
+
+class LazyLogRecord(object):
+    """
+    A captured log line that is only formatted the first time it is used as a string, (the result is cached).
+
+    list, dict, set and bytearray args are (shallow) copied when the record is created, so changes made to them after
+    the log call do not show up in the output.
+    """
+    __slots__ = ('level', 'msg', 'args', '_message')
+
+    def __init__(self, level, msg, args):
+        self.level = level
+        self.msg = msg
+        if args:
+            if isinstance(args, tuple):
+                args = tuple(map(_snapshot_arg, args))
+            else:
+                args = _snapshot_arg(args)
+        self.args = args
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            msg = self.msg
+            if self.args:
+                msg = msg % self.args
+            self._message = msg
+            self.args = None
+        return self._message
+
+    def __str__(self):
+        return '%s | %s' % (logging.getLevelName(self.level), self.message)
+
+    def __repr__(self):
+        return 'LazyLogRecord(%s, %r)' % (logging.getLevelName(self.level), self.msg)
 
 
 class LoggingMixin(object):
     _indent = IndentHelper()
     _print_log = False
     _log = None
+    # a sampling_helper.LogSampler, if set, it decides which log lines are written.
+    _log_sampler = None
+    # if True, the prefix data and indent level are passed as LogRecord fields (using "extra") instead of being
+    # added to the message.  (note: printed / recorded lines will not include the prefix either)
+    _log_structured = False
+    # if True, multi-line messages are written as a single LogRecord, with the prefix and indent repeated on each
+    # line, otherwise each line is written as its own LogRecord.
+    _log_multiline_record = False
 
     @property
     def _logger(self):
@@ -15,44 +73,159 @@ class LoggingMixin(object):
 
     @property
     def _log_prefix_format(self):
+        """
+        the format for the prefix data, it is worked out once for each class, (see _get_log_prefix_template) so
+        overrides must return the same format for every instance of a class.
+        """
         return '%s'
 
     @property
     def _log_prefix_data(self):
         return '',
 
+    @property
+    def _log_extra_data(self):
+        """
+        the LogRecord fields added in structured mode (in addition to "log_indent")
+        """
+        return {}
+
     def _call_on_log(self, lvl, msg, args):
         return lvl, msg, args
 
+    def _log_enabled_for(self, level):
+        # Logger.isEnabledFor keeps its own per level cache, (cleared by setLevel / logging.disable)
+        logger = self._log
+        if logger is None:
+            logger = self._logger
+        return logger.isEnabledFor(level)
+
     def _log_item(self, level, msg, *args, indent=None):
-        log_enabled = self._logger.isEnabledFor(level)
+        log_enabled = self._log_enabled_for(level)
 
         if not log_enabled and not self._print_log:
             return
 
+        if self._log_sampler is not None and not self._log_sampler.keep_log(level, self._logger.name):
+            return
+
+        if args and obj_formatters:
+            args = obj_formatters.wrap_args(args, msg)
+
         if '\n' in msg:
             if args:
                 msg = msg % args
             msg = msg.splitlines(keepends=False)
-            for m in msg:
-                self._log_item(level, m, indent=indent)
+            if self._log_structured:
+                for m in msg:
+                    self._log_line(level, m, (), indent, log_enabled)
+            else:
+                self._log_lines(level, msg, indent, log_enabled)
+            return
+
+        self._log_line(level, msg, args, indent, log_enabled)
+
+    def _log_pp(self, level, data_in, indent=None, **kwargs):
+        """
+        pretty prints data_in to the log, (kwargs are passed to pretty_print_output)
+
+        the lines are written as they are formatted, so the whole output is never held in memory, and nothing is
+        formatted if the level is not enabled.
+        """
+        log_enabled = self._log_enabled_for(level)
+        if not log_enabled and not self._print_log:
+            return
+
+        if self._log_sampler is not None and not self._log_sampler.keep_log(level, self._logger.name):
+            return
+
+        lines = iter_pretty_print_output(data_in, **kwargs)
+        if self._log_structured:
+            for line in lines:
+                self._log_line(level, line, (), indent, log_enabled)
+        else:
+            self._log_lines(level, lines, indent, log_enabled)
+
+    def _get_log_prefix_template(self):
+        # _log_prefix_format + '%s' (for the indent), kept in the class's own __dict__ so subclasses get their own,
+        # and the template goes away with the class.
+        cls = self.__class__
+        try:
+            return cls.__dict__['_log_prefix_template']
+        except KeyError:
+            template = self._log_prefix_format + '%s'
+            cls._log_prefix_template = template
+            return template
+
+    def _log_lines(self, level, lines, indent, log_enabled):
+        """
+        writes the lines of a multi-line message, the prefix and indent are worked out once for all of the lines.
+        """
+        if indent is None:
+            indent = self._indent.indent_str()
+        else:
+            indent = self._indent.pad(indent)
+        prefix_data = self._log_prefix_data + (indent,)
+
+        if self._log_multiline_record:
+            prefix = self._get_log_prefix_template() % prefix_data
+            lines = [prefix + ('\n' + prefix).join(lines)]
+            msg = '%s'
+            prefix_data = ()
+        else:
+            # the line is passed as the last arg so the msg is the same for every line.
+            msg = self._get_log_prefix_template() + '%s'
+
+        logger = self._logger
+        # records are made directly (with one findCaller call for all of the lines) for Logger objects, anything
+        # else (LoggerAdapter, etc...) goes through .log()
+        make_records = isinstance(logger, logging.Logger)
+        caller = None
+        for line in lines:
+            line_level, line_msg, line_args = self._call_on_log(level, msg, prefix_data + (line,))
+
+            if self._print_log:
+                rec = LazyLogRecord(line_level, line_msg, line_args)
+                line_msg = rec.message
+                line_args = ()
+                print(rec)
+
+            if log_enabled:
+                if line_level == 'exception':
+                    logger.exception(line_msg, *line_args)
+                    continue
+                if not make_records:
+                    logger.log(line_level, line_msg, *line_args)
+                    continue
+                if caller is None:
+                    caller = logger.findCaller()
+                fn, lno, func, sinfo = caller
+                logger.handle(logger.makeRecord(logger.name, line_level, fn, lno, line_msg, line_args, None, func,
+                                                None, sinfo))
+
+    def _log_line(self, level, msg, args, indent, log_enabled):
+        if self._log_structured:
+            self._log_line_structured(level, msg, args, indent, log_enabled)
             return
 
-        msg = self._log_prefix_format + '%s' + msg
+        try:
+            msg = self.__class__.__dict__['_log_prefix_template'] + msg
+        except KeyError:
+            msg = self._get_log_prefix_template() + msg
 
         if indent is None:
-            indent = str(self._indent)
+            indent = self._indent.indent_str()
         else:
-            indent = ''.rjust(indent, ' ')
+            indent = self._indent.pad(indent)
 
         args = self._log_prefix_data + (indent,) + args
         level, msg, args = self._call_on_log(level, msg, args)
 
         if self._print_log:
-            if args:
-                msg = msg % args
+            rec = LazyLogRecord(level, msg, args)
+            msg = rec.message
             args = []
-            print('%s | %s' % (logging.getLevelName(level), msg))
+            print(rec)
 
         if log_enabled:
             if level == 'exception':
@@ -60,6 +233,29 @@ class LoggingMixin(object):
             else:
                 self._logger.log(level, msg, *args)
 
+    def _log_line_structured(self, level, msg, args, indent, log_enabled):
+        if indent is None:
+            indent = self._indent.indent
+        elif self._indent.spaces:
+            indent = indent // self._indent.spaces
+
+        extra = self._log_extra_data
+        extra['log_indent'] = indent
+
+        level, msg, args = self._call_on_log(level, msg, args)
+
+        if self._print_log:
+            rec = LazyLogRecord(level, msg, args)
+            msg = rec.message
+            args = []
+            print(rec)
+
+        if log_enabled:
+            if level == 'exception':
+                self._logger.exception(msg, *args, extra=extra)
+            else:
+                self._logger.log(level, msg, *args, extra=extra)
+
     def _exception(self, *args, **kwargs):
         self._log_item(logging.ERROR, *args, **kwargs)
 
@@ -73,57 +269,138 @@ class LoggingMixin(object):
         self._log_item(logging.WARNING, *args, **kwargs)
 
     def _debug(self, *args, **kwargs):
+        # fast path, skips _log_item once the logger has been resolved and the level is disabled.
+        if self._log is not None and not self._print_log and not self._log.isEnabledFor(logging.DEBUG):
+            return
         self._log_item(logging.DEBUG, *args, **kwargs)
 
     def _info(self, *args, **kwargs):
+        if self._log is not None and not self._print_log and not self._log.isEnabledFor(logging.INFO):
+            return
         self._log_item(logging.INFO, *args, **kwargs)
 
 
 class LoggingRecordMixin(object):
+    """
+    Records the log lines in memory, so they can be returned with _get_logs().
+
+    The records are stored as LazyLogRecord objects, and only formatted when _get_logs() is called.  Set _log_recs_max
+    to only keep the latest x records (ring buffer).  Merging records from another object links to its buffers
+    instead of copying them, so records added to the other object later are included as well.
+
+    To capture logs from a multiprocessing worker, call _log_use_buffer(SharedLogBuffer()) in the worker, and merge
+    the same buffer into an object in the parent once the worker is done.  (see log_buffer_helper)  The lines in the
+    buffer are copied when it is merged, so the buffer can be closed after that.
+    """
     _log_recs = None
+    _log_segments = None
     _record_logs = False
+    _log_recs_max = None
 
     def __init__(self, *args, **kwargs):
-        self._log_recs = []
+        self._log_recs = deque(maxlen=self._log_recs_max)
+        self._log_segments = [self._log_recs]
         super(LoggingRecordMixin, self).__init__(*args, **kwargs)
 
+    def _get_log_segments(self):
+        if self._log_segments is None:
+            if self._log_recs is None:
+                self._log_recs = deque(maxlen=self._log_recs_max)
+            self._log_segments = [self._log_recs]
+        return self._log_segments
+
     def _call_on_log(self, lvl, msg, args):
         if self._record_logs:
-            if args:
-                msg = msg % args
-            args = []
-            self._log_recs.append('%s | %s' % (logging.getLevelName(lvl), msg))
+            if self._log_segments is None:
+                self._get_log_segments()
+            self._log_recs.append(LazyLogRecord(lvl, msg, args))
         return lvl, msg, args
 
+    def _log_use_buffer(self, buffer):
+        """
+        records any new log lines to "buffer" (a SharedLogBuffer or anything else with append() and clear())
+        """
+        self._get_log_segments()
+        self._log_recs = buffer
+        self._log_segments.append(buffer)
+
     def _log_merge_records(self, other, save_before=False):
-        if self._log_recs is None:
-            self._log_recs = []
-        if other is not None and other._log_recs:
-            other = other._log_recs
+        segments = self._get_log_segments()
+        if isinstance(other, SharedLogBuffer):
+            # copied, as the buffer file is closed and deleted once the worker's logs are merged.
+            other_segments = [deque(other, maxlen=self._log_recs_max)]
+        elif other is not None:
+            other_segments = other._log_segments
+        else:
+            other_segments = None
 
+        if other_segments:
             if save_before:
-                self._log_recs = other + self._log_recs
+                segments[:0] = other_segments
             else:
-                self._log_recs.extend(other)
+                segments.extend(other_segments)
+                # new records go after the merged ones.
+                self._log_recs = deque(maxlen=self._log_recs_max)
+                segments.append(self._log_recs)
 
     def _get_logs(self, sep='\n'):
-        log_recs = self._log_recs or ['Empty Logs']
+        log_recs = [rec for segment in self._get_log_segments() for rec in segment]
+        if self._log_recs_max is not None:
+            log_recs = log_recs[-self._log_recs_max:]
+        log_recs = [str(rec) for rec in log_recs] or ['Empty Logs']
         if sep is not None:
             return sep.join(log_recs)
         return log_recs
 
     def _clear_logs(self):
         if self._log_recs is not None:
-            self._log_recs.clear()
+            if isinstance(self._log_recs, deque):
+                # other objects may have merged this deque, a new one is used so their copy of the records is kept.
+                self._log_recs = deque(maxlen=self._log_recs_max)
+            else:
+                self._log_recs.clear()
+            self._log_segments = [self._log_recs]
 
 
 class LoggingModelMixin(LoggingMixin):
+    """
+    The model name and logger are resolved once for each subclass when it is created, so instances share them
+    without any lookups.  (set _model_name or _log in the class to override them)  Classes with a "filter" attribute
+    (querysets / managers) use the logger of the model of each instance instead, as one queryset / manager class
+    can be used by several models, these are kept in a {model: logger} dict on the class.
+    """
     _model_name = None
+    _model_logs = None
+
+    def __init_subclass__(cls, **kwargs):
+        super(LoggingModelMixin, cls).__init_subclass__(**kwargs)
+        if '_model_name' not in cls.__dict__:
+            cls._model_name = cls.__name__
+        if '_log' not in cls.__dict__:
+            if hasattr(cls, 'filter'):
+                # resolved for the model of each instance, (see _logger)
+                cls._log = None
+                cls._model_logs = WeakKeyDictionary()
+            else:
+                cls._log = logging.getLogger(cls._model_name)
+
+    @classmethod
+    def _get_model_logger(cls, model):
+        try:
+            return cls._model_logs[model]
+        except (KeyError, TypeError):
+            pass
+        model_log = getattr(model, '_log', None)
+        if model_log is None:
+            model_log = logging.getLogger(cls._get_model_name())
+        if model is not None and cls._model_logs is not None:
+            cls._model_logs[model] = model_log
+        return model_log
 
     @classmethod
     def _get_model_name(cls):
         if cls._model_name is None:
-            cls._model_name = cls.__class__.__name__
+            return cls.__name__
         return cls._model_name
 
     @property
@@ -134,12 +411,15 @@ class LoggingModelMixin(LoggingMixin):
     def _log_prefix_data(self):
         return self._get_model_name(), self.pk
 
+    @property
+    def _log_extra_data(self):
+        return {'model_name': self._get_model_name(), 'model_pk': self.pk}
+
     @property
     def _logger(self):
         if self._log is None:
             if hasattr(self, 'filter'):
-                self._log = self.model._log
-            if self._log is None:
-                self._log = logging.getLogger(self._get_model_name())
+                return self._get_model_logger(getattr(self, 'model', None))
+            self.__class__._log = logging.getLogger(self._get_model_name())
 
         return self._log
@@ -0,0 +1,198 @@
+"""
+Sampling and rate limiting for high volume logging.
+
+A LogSampler can be shared by DataLogger (sampler=) and the logging mixins (_log_sampler), it decides if a record
+or log line is kept before any formatting is done.
+
+usage:
+    sampler = LogSampler(rate=0.05, rate_limit=100, burst=200)
+
+    class MyClass(LoggingMixin):
+        _log_sampler = sampler
+
+    with DataLogger(account, url, 'GET', sampler=sampler) as dl:
+        ...
+"""
+__author__ = 'strohl'
+__version__ = '0.9'
+__status__ = 'Testing'
+
+import logging
+import random
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+__all__ = ['LogSampler', 'TokenBucket']
+
+
+class TokenBucket(object):
+    """
+    token bucket rate limiter, allows "rate" items per second on average with bursts of up to "burst" items.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'last', '_lock')
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.last = monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, count=1):
+        with self._lock:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= count:
+                self.tokens -= count
+                return True
+            return False
+
+    def __repr__(self):
+        return 'TokenBucket: %s/sec (burst %s), %.1f tokens' % (self.rate, self.burst, self.tokens)
+
+
+class _SessionState(object):
+    __slots__ = ('keep', 'error', 'buffer')
+
+    def __init__(self, keep):
+        self.keep = keep
+        self.error = False
+        self.buffer = []
+
+
+# field indexes in the DataLogger.end() field tuple
+_REQUEST_TYPE = 4
+_METHOD = 6
+
+
+def default_record_key(fields):
+    return fields[_REQUEST_TYPE], fields[_METHOD]
+
+
+class LogSampler(object):
+
+    def __init__(self, rate=1.0, rate_limit=None, burst=None, keep_errors=True, keep_error_sessions=True,
+                 error_level=logging.ERROR, record_key=default_record_key, max_keys=10000, max_sessions=10000,
+                 max_session_buffer=50, random_func=random.random):
+        """
+        @param rate: [0.0 - 1.0] head based sampling probability.  For DataLogger the decision is made once per
+            session, so whole sessions are kept or dropped.
+        @param rate_limit: if set, the max number of kept items per second for each key.  (token bucket)
+            keys are (logger name, level) for log lines and record_key(fields) for DataLogger records.
+        @param burst: the token bucket size (defaults to rate_limit)
+        @param keep_errors: T/F always keep errors. (log levels at or over error_level, DataLogger records with
+            is_error set)
+        @param keep_error_sessions: T/F when a DataLogger record is an error, keep the whole session.  Records from
+            sessions that were not sampled are held (up to max_session_buffer per session) until the parent record
+            ends, and written with the error.
+        @param error_level: log lines at or above this level are treated as errors.
+        @param record_key: function returning the rate limit key for a DataLogger field tuple.
+        @param max_keys: the max number of rate limit buckets kept, (the oldest are dropped)
+        @param max_sessions: the max number of open DataLogger sessions tracked, (the oldest are dropped)
+        @param max_session_buffer: the max number of records held for a session that was not sampled.
+        """
+        self.rate = rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.keep_errors = keep_errors
+        self.keep_error_sessions = keep_error_sessions
+        self.error_level = error_level
+        self.record_key = record_key
+        self.max_keys = max_keys
+        self.max_sessions = max_sessions
+        self.max_session_buffer = max_session_buffer
+        self.random_func = random_func
+
+        self.kept = 0
+        self.dropped = 0
+
+        self._buckets = OrderedDict()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rate_ok(self, key):
+        if self.rate_limit is None:
+            return True
+        try:
+            bucket = self._buckets[key]
+        except KeyError:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(self.rate_limit, self.burst)
+                    if len(self._buckets) > self.max_keys:
+                        self._buckets.popitem(last=False)
+        return bucket.take()
+
+    def _head_ok(self):
+        return self.rate >= 1.0 or self.random_func() < self.rate
+
+    def keep_log(self, level, name=None):
+        """
+        returns True if a log line should be written.
+        """
+        if self.keep_errors and level >= self.error_level:
+            keep = True
+        else:
+            keep = self._head_ok() and self._rate_ok((name, level))
+        if keep:
+            self.kept += 1
+        else:
+            self.dropped += 1
+        return keep
+
+    def _get_session(self, session_id):
+        try:
+            return self._sessions[session_id]
+        except KeyError:
+            state = self._sessions[session_id] = _SessionState(self._head_ok())
+            if len(self._sessions) > self.max_sessions:
+                self.dropped += len(self._sessions.popitem(last=False)[1].buffer)
+            return state
+
+    def sample_record(self, fields, session_id, is_parent, is_error):
+        """
+        returns the list of DataLogger field tuples to write for this record.  (empty if it was dropped or held,
+        more than one if held records from an error session are released)
+        """
+        with self._lock:
+            if is_parent:
+                state = self._sessions.pop(session_id, None)
+                if state is None:
+                    state = _SessionState(self._head_ok())
+            else:
+                state = self._get_session(session_id)
+
+            if is_error and self.keep_errors:
+                state.error = True
+                tmp_ret = state.buffer
+                tmp_ret.append(fields)
+                state.buffer = []
+            elif state.error and self.keep_error_sessions:
+                tmp_ret = [fields]
+            elif state.keep:
+                tmp_ret = [fields]
+            else:
+                tmp_ret = []
+                if is_parent or not self.keep_error_sessions or len(state.buffer) >= self.max_session_buffer:
+                    self.dropped += 1
+                else:
+                    state.buffer.append(fields)
+
+            if is_parent and state.buffer:
+                # the session ended without an error, the held records are not needed.
+                self.dropped += len(state.buffer)
+                state.buffer = []
+
+        keep_all = state.error and (is_error or self.keep_error_sessions)
+        if tmp_ret and not keep_all and not self._rate_ok(self.record_key(fields)):
+            self.dropped += len(tmp_ret)
+            tmp_ret = []
+
+        self.kept += len(tmp_ret)
+        return tmp_ret
+
+    def __repr__(self):
+        return 'LogSampler: rate=%s, %s kept, %s dropped' % (self.rate, self.kept, self.dropped)
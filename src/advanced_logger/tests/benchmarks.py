@@ -0,0 +1,120 @@
+"""
+Small timing checks for the hot paths, run with:
+
+    python -m advanced_logger.tests.benchmarks
+
+Each line is the time per call (or per loop) in microseconds, numbers are only comparable on the same machine.
+"""
+import logging
+import threading
+import timeit
+
+from advanced_logger.counter_helper import Counter, CounterSet, ShardedCounter
+from advanced_logger.data_logger_helper import quote
+from advanced_logger.helpers.formating_helper import pretty_print_output
+from advanced_logger.helpers.indent_helper import IndentHelper
+from advanced_logger.logging_helper import LoggingMixin
+
+
+def bench(name, func, number=1000, repeat=5):
+    per_call = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print('%-45s %12.2f us' % (name, per_call * 1000000))
+
+
+def bench_logging():
+    class Quiet(LoggingMixin):
+        _log = logging.getLogger('advanced_logger.bench')
+    logging.getLogger('advanced_logger.bench').setLevel(logging.WARNING)
+    obj = Quiet()
+    bench('LoggingMixin._debug (disabled level)', lambda: obj._debug('value %s', 1), number=100000)
+
+    indent = IndentHelper(size=3)
+    bench('IndentHelper.indent_str', indent.indent_str, number=100000)
+
+
+class _DiscardHandler(logging.Handler):
+    # formats the records, (so the log call does all of its work) without writing them anywhere.
+    def emit(self, record):
+        self.format(record)
+
+
+class _UncachedIndentHelper(IndentHelper):
+    # the indent step before the interned indent strings, (a new string on every call)
+    def indent_str(self, size=None):
+        if size is None:
+            return ' ' * self.spaces * self.indent
+        return ''.rjust(size * self.spaces, ' ')
+
+
+def bench_indented_logging(number=1000000):
+    logger = logging.getLogger('advanced_logger.bench.indented')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(_DiscardHandler())
+
+    class Cached(LoggingMixin):
+        _log = logger
+        _indent = IndentHelper(size=3)
+
+    class Uncached(LoggingMixin):
+        _log = logger
+        _indent = _UncachedIndentHelper(size=3)
+
+    for label, obj in (('before', Uncached()), ('after', Cached())):
+        bench('LoggingMixin._info indent 3, 1M calls (%s)' % label, lambda: obj._info('value %s', 1), number=number,
+              repeat=3)
+
+
+def bench_quote():
+    for size, label in ((1024, '1KB'), (64 * 1024, '64KB'), (5 * 1024 * 1024, '5MB')):
+        body = '"' + 'x' * size + '"'
+        bench('quote %s quoted str body, trim_to=1000' % label, lambda: quote(body, 1000), number=100)
+        data = b'x' * size
+        bench('quote %s bytes body, trim_to=1000' % label, lambda: quote(data, 1000), number=100)
+        payload = {'id': 1, 'status': 'ok', 'body': 'x' * size, 'items': list(range(size // 8))}
+        bench('quote %s dict payload, trim_to=1000' % label, lambda: quote(payload, 1000), number=100)
+
+
+def bench_pp():
+    flat = {'key_%s' % i: i for i in range(10000)}
+    bench('pretty_print_output flat 10k dict', lambda: pretty_print_output(flat), number=10, repeat=3)
+
+
+def bench_counters():
+    counter = Counter('slot', min_counter=0, max_counter=9, rollover=True)
+    bench('Counter.add(10 ** 9) on a 0-9 rollover', lambda: counter.add(10 ** 9), number=10000)
+    counter = Counter('many', max_counter=1000, rollover=True)
+    bench('Counter.add_many(100000, 7)', lambda: counter.add_many(100000, 7), number=1000)
+
+    counters = CounterSet(max_counter=1000000)
+    for i in range(10000):
+        counters.new('key%s' % i)
+    keys = ['key%s' % (i * 97) for i in range(100)]
+
+    def report():
+        for key in keys:
+            counters[key].add()
+        counters.report(header='{value_sum}', justify_name='<')
+    bench('CounterSet.report 10k counters, 100 changed', report, number=20, repeat=3)
+
+    sharded = ShardedCounter('sharded')
+
+    def threads():
+        def run():
+            for i in range(10000):
+                sharded.add()
+        workers = [threading.Thread(target=run) for i in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    bench('ShardedCounter 8 threads x 10k add()', threads, number=3, repeat=3)
+
+
+if __name__ == '__main__':
+    bench_logging()
+    bench_indented_logging()
+    bench_quote()
+    bench_pp()
+    bench_counters()
@@ -0,0 +1,81 @@
+import random
+import unittest
+
+from advanced_logger.counter_helper import CounterSet
+
+try:
+    from advanced_logger.counter_array_helper import ArrayCounterSet
+except ImportError:
+    ArrayCounterSet = None
+
+SEED = 20261018
+
+REPORT_KWARGS = dict(header='{num_counters} {value_sum} {value_min} {value_max}', justify_name='<')
+
+
+def counter_state(counters):
+    return {key: (c.value, c.min_value, c.max_value) for key, c in counters.counters.items()}
+
+
+@unittest.skipIf(ArrayCounterSet is None, 'numpy is not installed')
+class TestArrayCounterSet(unittest.TestCase):
+
+    def make_sets(self, rnd, **kwargs):
+        counters = CounterSet(**kwargs)
+        array_counters = ArrayCounterSet(capacity=2, **kwargs)
+        for i in range(rnd.randint(1, 8)):
+            value = rnd.randint(-8, 25)
+            counters.new('Key %s' % i, value)
+            array_counters.new('Key %s' % i, value)
+        return counters, array_counters
+
+    def test_matches_counter_set(self):
+        rnd = random.Random(SEED)
+        for i in range(500):
+            kwargs = dict(min_counter=rnd.choice((0, -5, 3)), max_counter=rnd.choice((None, 10, 20)),
+                          rollover=rnd.random() < 0.5)
+            counters, array_counters = self.make_sets(rnd, **kwargs)
+            for step in range(6):
+                keys = list(counters.keys())
+                action = rnd.random()
+                if action < 0.5:
+                    deltas = {}
+                    for key in rnd.sample(keys, rnd.randint(0, len(keys))):
+                        deltas[key] = rnd.choice((0, rnd.randint(-40, 40), (rnd.randint(0, 5), rnd.randint(-4, 4))))
+                    counters.bulk_update(deltas)
+                    array_counters.bulk_update(deltas)
+                elif action < 0.6:
+                    key = rnd.choice(keys)
+                    counters[key].add(3)
+                    array_counters[key].add(3)
+                elif action < 0.7:
+                    counters.clear()
+                    array_counters.clear()
+                elif action < 0.8:
+                    key = rnd.choice(keys)
+                    counters.lock(key)
+                    array_counters.lock(key)
+                elif action < 0.9 and len(keys) > 1:
+                    key = rnd.choice(keys)
+                    counters.remove(key)
+                    array_counters.remove(key)
+                self.assertEqual(counter_state(counters), counter_state(array_counters), kwargs)
+                self.assertEqual(list(counters.keys()), list(array_counters.keys()))
+            self.assertEqual(counters.report(**REPORT_KWARGS), array_counters.report(**REPORT_KWARGS))
+            self.assertEqual(counters.dump(), array_counters.dump())
+            self.assertEqual(sum(counters.values()), array_counters.sum())
+
+    def test_bulk_queries(self):
+        counters = ArrayCounterSet(max_counter=10, perc_decimal=0)
+        for key, value in (('a', 5), ('b', 9), ('c', 1), ('d', 7)):
+            counters.new(key, value)
+        self.assertEqual(counters.top(2), [('b', 9), ('d', 7)])
+        self.assertEqual(counters.top(2, lowest=True), [('c', 1), ('a', 5)])
+        self.assertEqual(counters.min(), ('c', 1))
+        self.assertEqual(counters.max(), ('b', 9))
+        self.assertEqual(list(counters.percs()), [50, 90, 10, 70])
+        self.assertEqual(str(counters['a']), 'a : 5 (50%)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import random
+import unittest
+
+from advanced_logger.counter_helper import Counter, CounterSet
+
+SEED = 20261018
+
+
+def make_counter(rnd, calls):
+    min_counter = rnd.choice((None, rnd.randint(-10, 10)))
+    if min_counter is None:
+        # (a max_counter needs a min_counter for the percentage)
+        max_counter = None
+        rollover = False
+    else:
+        max_counter = min_counter + rnd.randint(1, 30)
+        rollover = rnd.random() < 0.6
+    low = -20 if min_counter is None else min_counter
+    value = rnd.randint(low, max_counter if max_counter is not None else 40)
+    return dict(name='test', value=value, min_counter=min_counter, max_counter=max_counter, rollover=rollover,
+                call_every=rnd.choice((None, 1, 3, 7)), call_func=lambda counter: calls.append(counter.value))
+
+
+def state(counter):
+    return counter.value, counter.min_value, counter.max_value
+
+
+class TestAddMany(unittest.TestCase):
+
+    def test_matches_looped_add(self):
+        rnd = random.Random(SEED)
+        for i in range(1000):
+            kwargs_seed = rnd.random()
+            many_calls, loop_calls = [], []
+            many = Counter(**make_counter(random.Random(kwargs_seed), many_calls))
+            looped = Counter(**make_counter(random.Random(kwargs_seed), loop_calls))
+            for step in range(10):
+                n_times = rnd.randint(0, 40)
+                value = rnd.choice((1, 2, rnd.randint(0, 50)))
+                if rnd.random() < 0.5:
+                    many.add_many(n_times, value)
+                    for j in range(n_times):
+                        looped.add(value)
+                else:
+                    many.sub_many(n_times, value)
+                    for j in range(n_times):
+                        looped.sub(value)
+                self.assertEqual(state(many), state(looped), (many.min_counter, many.max_counter, many.rollover))
+            self.assertEqual(many_calls, loop_calls)
+
+    def test_no_min_counter(self):
+        many = Counter('test', min_counter=None)
+        looped = Counter('test', min_counter=None)
+        many.sub_many(5, 3)
+        many.add_many(2, 4)
+        for i in range(5):
+            looped.sub(3)
+        for i in range(2):
+            looped.add(4)
+        self.assertEqual(state(many), state(looped))
+        self.assertEqual(many.value, -7)
+
+
+class TestBulkUpdate(unittest.TestCase):
+
+    def test_matches_looped_add(self):
+        rnd = random.Random(SEED)
+        for min_counter, max_counter, rollover in ((0, None, False), (None, None, False), (-5, 5, True),
+                                                   (0, 9, False)):
+            bulk = CounterSet(min_counter=min_counter, max_counter=max_counter, rollover=rollover)
+            looped = CounterSet(min_counter=min_counter, max_counter=max_counter, rollover=rollover)
+            keys = ['key%s' % i for i in range(10)]
+            for key in keys:
+                bulk.new(key)
+                looped.new(key)
+            for step in range(20):
+                deltas = {}
+                for key in rnd.sample(keys, 4):
+                    if rnd.random() < 0.3:
+                        deltas[key] = (rnd.randint(0, 10), rnd.randint(0, 5))
+                    else:
+                        deltas[key] = rnd.randint(-15, 15)
+                bulk.bulk_update(deltas)
+                for key, delta in deltas.items():
+                    if isinstance(delta, tuple):
+                        for i in range(delta[0]):
+                            looped[key].add(delta[1])
+                    elif delta >= 0:
+                        for i in range(delta):
+                            looped[key].add(1)
+                    else:
+                        for i in range(-delta):
+                            looped[key].sub(1)
+                for key in keys:
+                    self.assertEqual(state(bulk[key]), state(looped[key]), (min_counter, max_counter, key))
+
+    def test_no_min_counter(self):
+        counters = CounterSet('a', min_counter=None)
+        counters.bulk_update({'a': 3})
+        counters.bulk_update({'a': -5})
+        self.assertEqual(counters['a'].value, -2)
+        self.assertEqual(counters['a'].min_value, -2)
+        self.assertEqual(counters['a'].max_value, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
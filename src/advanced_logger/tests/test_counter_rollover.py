@@ -0,0 +1,185 @@
+import random
+import sys
+import unittest
+
+from advanced_logger.counter_helper import AdvCounter, Counter, _roll_over_max, _roll_under_min
+
+SEED = 20261018
+
+
+def loop_counter_over(value, min_counter, max_counter):
+    # Counter.add before the closed form rollover
+    while value > max_counter:
+        value = min_counter + (value - max_counter) - 1
+    return value
+
+
+def loop_counter_under(value, min_counter, max_counter):
+    # Counter.sub before the closed form rollover
+    while value < min_counter:
+        value = max_counter - (min_counter - value) + 1
+    return value
+
+
+def loop_adv_over(value, min_counter, max_counter):
+    # AdvCounter.add before the closed form rollover
+    while value > max_counter:
+        value = min_counter + (value - max_counter)
+    return value
+
+
+def loop_adv_under(value, min_counter, max_counter):
+    # AdvCounter.sub before the closed form rollover
+    while value < min_counter:
+        value = max_counter - (min_counter - value)
+    return value
+
+
+class LoopCounter(object):
+    """
+    the add / sub / min / max behaviour of Counter with the rollover loops, to check Counter against.
+    """
+
+    def __init__(self, value, min_counter, max_counter, rollover):
+        self.min_counter = min_counter
+        # the same as Counter, a max_counter of 0 means no max.
+        self.max_counter = max_counter or sys.maxsize
+        self.rollover = rollover
+        self.value = min(max(value, min_counter), self.max_counter)
+        self.min_value = min(0, self.value)
+        self.max_value = max(0, self.value)
+
+    def add(self, value):
+        self.value += value
+        if self.value > self.max_counter:
+            if self.rollover:
+                self.value = loop_counter_over(self.value, self.min_counter, self.max_counter)
+            else:
+                self.value = self.max_counter
+        self._update()
+
+    def sub(self, value):
+        self.value -= value
+        if self.value < self.min_counter:
+            if self.rollover:
+                self.value = loop_counter_under(self.value, self.min_counter, self.max_counter)
+            else:
+                self.value = self.min_counter
+        self._update()
+
+    def _update(self):
+        self.min_value = min(self.min_value, self.value)
+        self.max_value = max(self.max_value, self.value)
+
+
+class TestRollHelpers(unittest.TestCase):
+
+    def check_over(self, value, min_counter, max_counter):
+        self.assertEqual(
+            _roll_over_max(value, max_counter, max_counter - min_counter + 1),
+            loop_counter_over(value, min_counter, max_counter),
+            (value, min_counter, max_counter))
+        if max_counter > min_counter:
+            self.assertEqual(
+                _roll_over_max(value, max_counter, max_counter - min_counter),
+                loop_adv_over(value, min_counter, max_counter),
+                (value, min_counter, max_counter))
+
+    def check_under(self, value, min_counter, max_counter):
+        self.assertEqual(
+            _roll_under_min(value, min_counter, max_counter - min_counter + 1),
+            loop_counter_under(value, min_counter, max_counter),
+            (value, min_counter, max_counter))
+        if max_counter > min_counter:
+            self.assertEqual(
+                _roll_under_min(value, min_counter, max_counter - min_counter),
+                loop_adv_under(value, min_counter, max_counter),
+                (value, min_counter, max_counter))
+
+    def test_off_by_one(self):
+        # Counter: max + 1 -> min, min - 1 -> max.   AdvCounter: max + 1 -> min + 1, min - 1 -> max - 1
+        self.assertEqual(_roll_over_max(10, 9, 10), 0)
+        self.assertEqual(_roll_under_min(-1, 0, 10), 9)
+        self.assertEqual(_roll_over_max(10, 9, 9), 1)
+        self.assertEqual(_roll_under_min(-1, 0, 9), 8)
+        for min_counter, max_counter in ((0, 9), (-5, 5), (3, 4), (7, 7), (-10, -2)):
+            size = max_counter - min_counter + 1
+            for value in (max_counter + 1, max_counter + 2, max_counter + size, max_counter + size + 1):
+                self.check_over(value, min_counter, max_counter)
+            for value in (min_counter - 1, min_counter - 2, min_counter - size, min_counter - size - 1):
+                self.check_under(value, min_counter, max_counter)
+
+    def test_random_values(self):
+        rnd = random.Random(SEED)
+        for i in range(20000):
+            min_counter = rnd.randint(-50, 50)
+            max_counter = min_counter + rnd.randint(0, 60)
+            self.check_over(max_counter + rnd.randint(1, 400), min_counter, max_counter)
+            self.check_under(min_counter - rnd.randint(1, 400), min_counter, max_counter)
+
+    def test_large_increment(self):
+        # far too many loops to check against, but the result has to be in range and congruent.
+        value = _roll_over_max(10 ** 12 + 3, 9, 10)
+        self.assertEqual(value, 3)
+        self.assertEqual(_roll_under_min(-10 ** 12 - 3, 0, 10), 7)
+
+
+class TestCounterRollover(unittest.TestCase):
+
+    def test_counter_matches_loops(self):
+        rnd = random.Random(SEED)
+        for i in range(1000):
+            min_counter = rnd.randint(-10, 10)
+            max_counter = min_counter + rnd.randint(1, 30)
+            rollover = rnd.random() < 0.7
+            value = rnd.randint(min_counter, max_counter)
+            counter = Counter('test', value=value, min_counter=min_counter, max_counter=max_counter,
+                              rollover=rollover)
+            expected = LoopCounter(value, min_counter, max_counter, rollover)
+            for step in range(20):
+                amount = rnd.choice((1, 1, max_counter - min_counter, max_counter - min_counter + 1,
+                                     rnd.randint(0, 200)))
+                if rnd.random() < 0.5:
+                    counter.add(amount)
+                    expected.add(amount)
+                else:
+                    counter.sub(amount)
+                    expected.sub(amount)
+                self.assertEqual(
+                    (counter.value, counter.min_value, counter.max_value),
+                    (expected.value, expected.min_value, expected.max_value),
+                    (min_counter, max_counter, rollover, amount))
+
+    def test_counter_large_add(self):
+        counter = Counter('slot', min_counter=0, max_counter=9, rollover=True)
+        counter.add(10 ** 9 + 4)
+        self.assertEqual(counter.value, 4)
+        counter.sub(10 ** 9 + 5)
+        self.assertEqual(counter.value, 9)
+
+    def test_adv_counter_matches_loops(self):
+        rnd = random.Random(SEED)
+        for i in range(500):
+            min_counter = rnd.randint(0, 10)
+            max_counter = min_counter + rnd.randint(1, 30)
+            counter = AdvCounter('test', value=min_counter, min_counter=min_counter, max_counter=max_counter,
+                                 rollover=True)
+            expected = counter.value
+            for step in range(20):
+                amount = rnd.randint(0, 100)
+                if rnd.random() < 0.5:
+                    counter.add(amount)
+                    expected = loop_adv_over(expected + amount, counter.min_counter, max_counter)
+                else:
+                    counter.sub(amount)
+                    expected = loop_adv_under(expected - amount, counter.min_counter, max_counter)
+                self.assertEqual(counter.value, expected)
+
+    def test_no_max_counter(self):
+        counter = Counter('test', rollover=True)
+        counter.add(sys.maxsize)
+        self.assertEqual(counter.value, sys.maxsize)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import threading
+import unittest
+
+from advanced_logger.data_logger_aggregate import DataLogAggregateSink
+
+
+def make_fields(url, response_time=0.01, response_code=200):
+    fields = [None] * 16
+    fields[4] = 'api'
+    fields[5] = url
+    fields[6] = 'GET'
+    fields[7] = 0
+    fields[10] = response_code
+    fields[11] = 100
+    fields[12] = response_time
+    fields[15] = response_code != 200
+    return tuple(fields)
+
+
+class TestAggregateSink(unittest.TestCase):
+
+    def test_summaries(self):
+        sink = DataLogAggregateSink(background=False, flush_interval=3600)
+        sink.write(make_fields('http://x.com/users/1'))
+        sink.write(make_fields('http://x.com/users/2', 0.02))
+        sink.write(make_fields('http://x.com/users/3', 0.5, 500))
+        rows = {(row['url'], row['response_code']): row for row in sink.summaries()}
+        self.assertEqual(rows[('http://x.com/users/{id}', 200)]['count'], 2)
+        self.assertEqual(rows[('http://x.com/users/{id}', 500)]['errors'], 1)
+        self.assertEqual(len(sink.summaries(clear=True)), 2)
+        self.assertEqual(sink.summaries(), [])
+        sink.close()
+
+    def test_summaries_while_writing(self):
+        sink = DataLogAggregateSink(background=False, flush_interval=3600)
+        stop = threading.Event()
+
+        def writer():
+            i = 0
+            while not stop.is_set():
+                # new keys keep being added while summaries() iterates the stats
+                sink.write(make_fields('http://x.com/page%s' % (i % 500)))
+                i += 1
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for i in range(50):
+                sink.summaries(clear=not i % 10)
+        finally:
+            stop.set()
+            thread.join()
+        sink.summaries(clear=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import math
+import os
+import tempfile
+import unittest
+
+from advanced_logger.data_logger_columnar import DataLogColumnarReader, DataLogColumnarSink, NULL_INT
+from advanced_logger.data_logger_helper import DataLogger
+
+
+class TestColumnarSink(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.dlc')
+        os.close(fd)
+        os.remove(self.filename)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_bad_numeric_values(self):
+        with DataLogColumnarSink(self.filename, block_rows=2) as sink:
+            with DataLogger('acct', 'http://x.com/a', 'GET', sink=sink) as dl:
+                dl.end(200, 'ok', {}, '12kb')
+            with DataLogger('acct', 'http://x.com/b', 'GET', sink=sink) as dl:
+                dl.end(200, 'ok', {}, 2048)
+            with DataLogger('acct', 'http://x.com/c', 'GET', sink=sink) as dl:
+                dl.end(500, 'err', {}, None)
+
+        with DataLogColumnarReader(self.filename) as reader:
+            self.assertEqual(len(reader), 3)
+            for name in reader.column_names:
+                self.assertEqual(len(reader.column(name)), 3, name)
+            self.assertEqual(list(reader['response_size']), [NULL_INT, 2048, NULL_INT])
+            self.assertEqual(reader['url'], ['http://x.com/a', 'http://x.com/b', 'http://x.com/c'])
+            self.assertEqual(list(reader['is_error']), [0, 0, 1])
+            self.assertFalse(math.isnan(reader['start_time'][2]))
+
+    def write_records(self, urls, block_rows=2):
+        with DataLogColumnarSink(self.filename, block_rows=block_rows) as sink:
+            for url in urls:
+                with DataLogger('acct', url, 'GET', sink=sink) as dl:
+                    dl.end(200, 'body of %s' % url, {}, len(url))
+
+    def test_column_views(self):
+        self.write_records(['http://x.com/%s' % i for i in range(5)])
+        with DataLogColumnarReader(self.filename) as reader:
+            views = reader.column_views('response_size')
+            self.assertEqual([len(view) for view in views], [2, 2, 1])
+            self.assertTrue(all(isinstance(view, memoryview) and view.readonly for view in views))
+            self.assertEqual([value for view in views for value in view], [14] * 5)
+            for view in views:
+                view.release()
+            # the dictionary is only decoded once a column needs it
+            self.assertIsNone(reader._dictionary)
+            self.assertEqual(reader['response_text'][4], 'body of http://x.com/4')
+            self.assertEqual(reader.column('url')[3], 'http://x.com/3')
+            with self.assertRaises(KeyError):
+                reader.column_views('response_text')
+
+    def test_truncated_last_block(self):
+        self.write_records(['http://x.com/a', 'http://x.com/b', 'http://x.com/c', 'http://x.com/d'])
+        size = os.path.getsize(self.filename)
+        with open(self.filename, 'r+b') as f:
+            f.truncate(size - 20)
+        with DataLogColumnarReader(self.filename) as reader:
+            self.assertEqual(len(reader), 2)
+            self.assertEqual(reader['url'], ['http://x.com/a', 'http://x.com/b'])
+
+        self.write_records(['http://x.com/e'])
+        with DataLogColumnarReader(self.filename) as reader:
+            self.assertEqual(reader.data_end, os.path.getsize(self.filename))
+            self.assertEqual(reader['url'], ['http://x.com/a', 'http://x.com/b', 'http://x.com/e'])
+            for name in reader.column_names:
+                self.assertEqual(len(reader.column(name)), 3, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from advanced_logger.data_logger_helper import DataLogWriter, quote
+
+
+class ListSink(object):
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, fields, trim_to=1000):
+        self.records.append(fields)
+
+
+class TestDataLogWriter(unittest.TestCase):
+
+    def test_put_after_stop(self):
+        sink = ListSink()
+        writer = DataLogWriter()
+        writer.put(('a',), sink=sink)
+        writer.stop()
+        self.assertEqual(sink.records, [('a',)])
+
+        self.assertTrue(writer.put(('b',), sink=sink))
+        self.assertEqual(sink.records, [('a',), ('b',)])
+        self.assertEqual(len(writer), 0)
+        self.assertTrue(writer.flush(timeout=1))
+
+    def test_flush_without_thread(self):
+        sink = ListSink()
+        writer = DataLogWriter(start=False)
+        writer.put(('a',), sink=sink)
+        writer.put(('b',), sink=sink)
+        self.assertTrue(writer.flush())
+        self.assertEqual(sink.records, [('a',), ('b',)])
+
+
+class TestQuote(unittest.TestCase):
+
+    def test_quote(self):
+        self.assertEqual(quote('"a|b\nc"'), 'a:b - c')
+        self.assertEqual(quote('say "hi"', 5), "say '")
+        self.assertEqual(quote(None), 'None')
+
+    def test_quoted_trim(self):
+        self.assertEqual(quote('"abcdef"', 3), 'abc')
+        self.assertEqual(quote('"abc"', 3), 'abc')
+        self.assertEqual(quote('"ab"', 3), 'ab')
+        self.assertEqual(quote('"', 3), '')
+        self.assertEqual(quote('""', 3), '')
+
+    def test_non_str_matches_full_repr(self):
+        values = [b'abc', b'x' * 50, bytearray(b'y' * 40), b'\x00\xff|' * 30, {'a': 'z' * 300, 'b': [1, 2]},
+                  [b'q' * 100], (1,) * 100, {1, 2, 3}, {'k': {'n': 'v|\n' * 10}}, 12.5]
+        for trim_to in (5, 20, 100, 1000):
+            for value in values:
+                self.assertEqual(quote(value, trim_to), quote(repr(value), trim_to), (value, trim_to))
+
+    def test_large_payload_not_formatted(self):
+        class Payload(object):
+            def __repr__(self):
+                raise AssertionError('repr() called on an item that is not in the output')
+        self.assertEqual(quote([1, 2] + [Payload()] * 10 ** 6, 4), '[1, ')
+        self.assertEqual(quote({'body': 'x' * 10 ** 6, 'later': Payload()}, 12), "{'body': 'xx")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from decimal import Decimal
+
+from advanced_logger.helpers.formating_helper import FormattedObj, ObjFormatterRegistry, obj_formatters, \
+    pretty_print_output
+
+
+class TestWrapArgs(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ObjFormatterRegistry()
+        self.registry.register(Decimal, lambda obj: 'D(%s)' % obj)
+        self.registry.register(dict, lambda obj: 'dict with %s keys' % len(obj))
+
+    def format(self, msg, *args):
+        args = self.registry.wrap_args(args, msg)
+        if len(args) == 1 and isinstance(args[0], dict):
+            return msg % args[0]
+        return msg % args
+
+    def test_string_conversions(self):
+        self.assertEqual(self.format('amount %s / %r', Decimal('1.5'), Decimal('2')), 'amount D(1.5) / D(2)')
+
+    def test_numeric_conversions(self):
+        self.assertEqual(self.format('amount %.2f %s', Decimal('1.5'), Decimal('2')), 'amount 1.50 D(2)')
+        self.assertEqual(self.format('%*d|%s', 4, Decimal('3'), Decimal('2')), '   3|D(2)')
+        self.assertEqual(self.format('100%% %d', Decimal('7')), '100% 7')
+
+    def test_mapping_arg(self):
+        data = {'amount': Decimal('1.5'), 'total': Decimal('10')}
+        self.assertEqual(self.format('%(amount)s of %(total).1f', data), 'D(1.5) of 10.0')
+
+    def test_without_msg(self):
+        args = self.registry.wrap_args((Decimal('1'), 3))
+        self.assertIsInstance(args[0], FormattedObj)
+        self.assertEqual(args[1], 3)
+
+
+class ReprCounter(object):
+    calls = 0
+
+    def __repr__(self):
+        ReprCounter.calls += 1
+        return 'ReprCounter()'
+
+
+class TestPrettyPrintMaxChars(unittest.TestCase):
+
+    def setUp(self):
+        ReprCounter.calls = 0
+
+    def test_small_output_unchanged(self):
+        data = {'a': {'b': {'c': {'d': [1, 'x', {'y': None}], 'e': {3, 1}}}}, 'f': 'text'}
+        self.assertEqual(pretty_print_output(data, max_chars=1000), pretty_print_output(data))
+
+        deep = [[[[[[[[[[1, {'x': (2, [3, {'y': 'z' * 50}])}]]]]]]]]]]
+        looped = [1, {'x': 2}]
+        looped.append(looped)
+        looped[1]['self'] = looped[1]
+        for data in ({'a': deep}, {'a': {'b': deep}}, [deep, looped], {'a': looped}):
+            for recurse_level in (0, 1, 3):
+                self.assertEqual(pretty_print_output(data, recurse_level=recurse_level, max_chars=10 ** 6),
+                                 pretty_print_output(data, recurse_level=recurse_level), (data, recurse_level))
+        self.assertEqual(pretty_print_output({'a': [[[[[[[[1]]]]]]]]}, recurse_level=1, max_chars=10 ** 6),
+                         'a = [[[[[[[[1]]]]]]]]')
+
+    def test_repr_at_recurse_level_is_bounded(self):
+        data = {'a': {'b': {'c': [ReprCounter() for i in range(100000)]}}}
+        self.assertEqual(pretty_print_output(data, max_chars=200), '[output truncated]')
+        self.assertLess(ReprCounter.calls, 200)
+
+    def test_nested_repr_is_bounded(self):
+        data = {'a': {'b': {'c': {i: [ReprCounter()] * 1000 for i in range(1000)}}}}
+        pretty_print_output(data, max_chars=200)
+        self.assertLess(ReprCounter.calls, 200)
+
+    def test_long_string_is_trimmed(self):
+        output = pretty_print_output({'a': 'x' * 1000, 'b': 'y\n' * 1000}, max_chars=100, ret_as_list=True)
+        self.assertEqual(output, ['[output truncated]'])
+        output = pretty_print_output(['short', 'y\n' * 1000], max_chars=100, ret_as_list=True)
+        self.assertEqual(output[0], '- short')
+        self.assertEqual(output[-1], '[output truncated]')
+        self.assertLess(len(output), 60)
+
+
+class TestPrettyPrintScalarFormatters(unittest.TestCase):
+
+    def setUp(self):
+        obj_formatters.register(float, lambda obj: '%.1f' % obj)
+
+    def tearDown(self):
+        obj_formatters.unregister(float)
+
+    def test_nested_scalars_use_formatter(self):
+        self.assertEqual(pretty_print_output(1.2345), '1.2')
+        self.assertEqual(pretty_print_output({'a': 1.2345}), 'a = 1.2')
+        self.assertEqual(pretty_print_output([[1.2345]]), '- - 1.2')
+        # values without a formatter still use the fast path
+        self.assertEqual(pretty_print_output({'a': 1, 'b': 'x', 'c': None}), 'a = 1\nb = x')
+
+
+class TestRegisterScalarFormatter(unittest.TestCase):
+
+    def tearDown(self):
+        obj_formatters.unregister(float)
+
+    def test_register_float_formatter(self):
+        data = {'a': 1.5, 'b': [2.5]}
+        self.assertEqual(pretty_print_output(data, ret_as_list=True), ['a = 1.5', 'b = - 2.5'])
+        obj_formatters.register(float, lambda obj: 'F(%s)' % obj)
+        self.assertEqual(pretty_print_output(data, ret_as_list=True), ['a = F(1.5)', 'b = - F(2.5)'])
+        obj_formatters.unregister(float)
+        self.assertEqual(pretty_print_output(data, ret_as_list=True), ['a = 1.5', 'b = - 2.5'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from advanced_logger.helpers.indent_helper import ContextIndentHelper, IndentHelper
+
+
+class TestIndentHelper(unittest.TestCase):
+
+    def test_pad(self):
+        for indent in (IndentHelper(spaces=4, max_size=10), ContextIndentHelper(spaces=4, max_size=10)):
+            for num_spaces in (-400, -2, -1, 0, 1, 7, 40, 41, 500):
+                self.assertEqual(indent.pad(num_spaces), ''.rjust(num_spaces), num_spaces)
+
+    def test_indent_str(self):
+        indent = IndentHelper(size=2, spaces=3, max_size=5)
+        self.assertEqual(indent.indent_str(), '      ')
+        self.assertEqual(indent.indent_str(-1), '')
+        self.assertEqual(indent.indent_str(0), '')
+        self.assertEqual(indent.indent_str(4), ' ' * 12)
+        self.assertEqual(indent.indent_str(50), ' ' * 15)
+        indent.s(10)
+        self.assertEqual(indent.indent_str(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
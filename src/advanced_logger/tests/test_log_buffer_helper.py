@@ -0,0 +1,88 @@
+import gc
+import logging
+import os
+import pickle
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from advanced_logger.log_buffer_helper import SharedLogBuffer
+from advanced_logger.logging_helper import LoggingMixin, LoggingRecordMixin
+
+
+class Recorder(LoggingRecordMixin, LoggingMixin):
+    _record_logs = True
+    _log = logging.getLogger('advanced_logger.tests.buffer')
+
+
+def run_worker(buffer, name):
+    logging.getLogger('advanced_logger.tests.buffer').setLevel(logging.DEBUG)
+    obj = Recorder()
+    obj._log_use_buffer(buffer)
+    obj._info('%s line 1', name)
+    obj._info('%s line 2', name)
+    buffer.close()
+    return name
+
+
+class TestSharedLogBuffer(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger('advanced_logger.tests.buffer').setLevel(logging.DEBUG)
+
+    def test_ring(self):
+        with SharedLogBuffer(slots=3, slot_size=16) as buffer:
+            for i in range(5):
+                buffer.append('line %s' % i)
+            buffer.append('x' * 100)
+            self.assertEqual(buffer.count, 6)
+            self.assertEqual(list(buffer), ['line 3', 'line 4', 'x' * 12])
+            buffer.clear()
+            self.assertEqual(buffer.get_logs(), 'Empty Logs')
+        self.assertFalse(os.path.exists(buffer.filename))
+
+    def test_pickle_attaches(self):
+        with SharedLogBuffer(slots=10) as buffer:
+            attached = pickle.loads(pickle.dumps(buffer))
+            attached.append('from the copy')
+            self.assertEqual(list(buffer), ['from the copy'])
+            attached.close()
+            self.assertTrue(os.path.exists(buffer.filename))
+
+    def test_closed_buffer_is_empty(self):
+        buffer = SharedLogBuffer(slots=10)
+        buffer.append('line')
+        buffer.close(unlink=True)
+        self.assertEqual(list(buffer), [])
+        self.assertEqual(len(buffer), 0)
+
+    def test_unlinked_when_collected(self):
+        buffer = SharedLogBuffer(slots=10)
+        filename = buffer.filename
+        del buffer
+        gc.collect()
+        self.assertFalse(os.path.exists(filename))
+
+    def test_merge_from_processes(self):
+        parent = Recorder()
+        parent._info('parent line')
+        buffers = [SharedLogBuffer(slots=10) for i in range(2)]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            names = list(executor.map(run_worker, buffers, ['worker_a', 'worker_b']))
+        self.assertEqual(names, ['worker_a', 'worker_b'])
+        for buffer in buffers:
+            parent._log_merge_records(buffer)
+            buffer.close(unlink=True)
+            self.assertFalse(os.path.exists(buffer.filename))
+        parent._info('parent after merge')
+        self.assertEqual(parent._get_logs(sep=None), [
+            'INFO | parent line',
+            'INFO | worker_a line 1',
+            'INFO | worker_a line 2',
+            'INFO | worker_b line 1',
+            'INFO | worker_b line 2',
+            'INFO | parent after merge',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import gc
+import logging
+import unittest
+import weakref
+
+from advanced_logger.logging_helper import LoggingMixin, LoggingModelMixin, LoggingRecordMixin
+
+
+class Recorder(LoggingRecordMixin, LoggingMixin):
+    _record_logs = True
+    _log = logging.getLogger('advanced_logger.tests.recorder')
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestEnabledLevels(unittest.TestCase):
+
+    def test_level_changes(self):
+        logger = logging.getLogger('advanced_logger.tests.levels')
+        handler = ListHandler()
+        logger.addHandler(handler)
+
+        class Levels(LoggingMixin):
+            _log = logger
+        obj = Levels()
+        try:
+            logger.setLevel(logging.WARNING)
+            obj._debug('one')
+            logger.setLevel(logging.DEBUG)
+            obj._debug('two')
+            logging.disable(logging.INFO)
+            obj._info('three')
+            logging.disable(logging.NOTSET)
+            obj._info('four')
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(handler.messages, ['two', 'four'])
+
+    def test_logging_not_patched(self):
+        self.assertEqual(logging.Manager._clear_cache.__module__, 'logging')
+
+
+class TestPrefixTemplate(unittest.TestCase):
+
+    def test_per_class_template(self):
+        class Base(LoggingRecordMixin, LoggingMixin):
+            _record_logs = True
+            _log = logging.getLogger('advanced_logger.tests.prefix')
+
+        class Prefixed(Base):
+            @property
+            def _log_prefix_format(self):
+                return '[%s] '
+
+            @property
+            def _log_prefix_data(self):
+                return 'p',
+
+        logging.getLogger('advanced_logger.tests.prefix').setLevel(logging.INFO)
+        base, prefixed = Base(), Prefixed()
+        base._info('one')
+        prefixed._info('two')
+        base._info('three')
+        self.assertEqual(base._get_logs(), 'INFO | one\nINFO | three')
+        self.assertEqual(prefixed._get_logs(), 'INFO | [p] two')
+
+    def test_class_not_kept_alive(self):
+        class Temp(LoggingMixin):
+            _log = logging.getLogger('advanced_logger.tests.prefix')
+        logging.getLogger('advanced_logger.tests.prefix').setLevel(logging.INFO)
+        Temp()._info('line')
+        Temp()._info('line 1\nline 2')
+        ref = weakref.ref(Temp)
+        del Temp
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class TestMultiLine(unittest.TestCase):
+
+    def test_logger_adapter(self):
+        logger = logging.getLogger('advanced_logger.tests.adapter')
+        logger.setLevel(logging.INFO)
+        handler = ListHandler()
+        logger.addHandler(handler)
+        try:
+            class Adapted(LoggingMixin):
+                _log = logging.LoggerAdapter(logger, {})
+            Adapted()._info('line 1\nline 2')
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(handler.messages, ['line 1', 'line 2'])
+
+
+class TestLogRecords(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger('advanced_logger.tests.recorder').setLevel(logging.DEBUG)
+
+    def test_merge_then_clear_child(self):
+        parent = Recorder()
+        child = Recorder()
+        parent._info('parent line')
+        child._info('child line')
+        parent._log_merge_records(child)
+        child._clear_logs()
+        child._info('child after clear')
+        self.assertEqual(parent._get_logs(), 'INFO | parent line\nINFO | child line')
+        self.assertEqual(child._get_logs(), 'INFO | child after clear')
+
+
+class TestModelMixin(unittest.TestCase):
+
+    def test_queryset_logger_per_model(self):
+        class ModelA(LoggingModelMixin):
+            pk = 1
+
+        class ModelB(LoggingModelMixin):
+            pk = 2
+
+        class QuerySet(LoggingModelMixin):
+            pk = None
+
+            def __init__(self, model):
+                self.model = model
+
+            def filter(self):
+                return self
+
+        self.assertEqual((QuerySet(ModelA)._logger.name, QuerySet(ModelB)._logger.name), ('ModelA', 'ModelB'))
+        self.assertIs(QuerySet(ModelA)._logger, ModelA._log)
+        self.assertIs(QuerySet(ModelB)._logger, ModelB._log)
+        self.assertNotIn('_log', QuerySet(ModelA).__dict__)
+        self.assertEqual(set(QuerySet._model_logs), {ModelA, ModelB})
+
+    def test_manager_with_model_attribute(self):
+        class Model(LoggingModelMixin):
+            pk = 1
+
+        class Manager(LoggingModelMixin):
+            model = Model
+
+            def filter(self):
+                return self
+
+        self.assertIs(Manager()._logger, Model._log)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import logging
+import random
+import unittest
+from unittest import mock
+
+from advanced_logger import sampling_helper
+from advanced_logger.sampling_helper import LogSampler, TokenBucket
+
+SEED = 20261018
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_fields(request_type='api', method='GET'):
+    fields = [None] * 16
+    fields[4] = request_type
+    fields[6] = method
+    return tuple(fields)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(sampling_helper, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_refill(self):
+        bucket = TokenBucket(rate=10, burst=5)
+        self.assertEqual([bucket.take() for i in range(7)], [True] * 5 + [False] * 2)
+        self.clock.now += 0.25
+        # 2.5 tokens refilled
+        self.assertEqual([bucket.take() for i in range(3)], [True, True, False])
+        self.clock.now += 100
+        # capped at the burst size
+        self.assertEqual(sum(bucket.take() for i in range(10)), 5)
+
+    def test_take_count(self):
+        bucket = TokenBucket(rate=4)
+        self.assertTrue(bucket.take(3))
+        self.assertFalse(bucket.take(2))
+        self.clock.now += 0.25
+        self.assertTrue(bucket.take(2))
+
+
+class TestLogSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(sampling_helper, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keep_rate(self):
+        for rate in (0.01, 0.1, 0.5, 0.9):
+            sampler = LogSampler(rate=rate, random_func=random.Random(SEED).random)
+            kept = sum(sampler.keep_log(logging.INFO, 'name') for i in range(20000))
+            self.assertAlmostEqual(kept / 20000, rate, delta=0.01, msg=rate)
+            self.assertEqual((sampler.kept, sampler.dropped), (kept, 20000 - kept))
+
+    def test_errors_always_kept(self):
+        sampler = LogSampler(rate=0.0, rate_limit=1)
+        self.assertFalse(sampler.keep_log(logging.INFO, 'name'))
+        self.assertTrue(all(sampler.keep_log(logging.ERROR, 'name') for i in range(100)))
+
+    def test_rate_limit_refill(self):
+        sampler = LogSampler(rate_limit=10, burst=10)
+        self.assertEqual(sum(sampler.keep_log(logging.INFO, 'a') for i in range(50)), 10)
+        # each (name, level) has its own bucket
+        self.assertEqual(sum(sampler.keep_log(logging.DEBUG, 'a') for i in range(50)), 10)
+        self.clock.now += 0.5
+        self.assertEqual(sum(sampler.keep_log(logging.INFO, 'a') for i in range(50)), 5)
+
+    def test_sessions_kept_or_dropped_whole(self):
+        sampler = LogSampler(rate=0.3, keep_error_sessions=False, random_func=random.Random(SEED).random)
+        kept_sessions = 0
+        for session in range(2000):
+            results = [len(sampler.sample_record(make_fields(), session, False, False)) for i in range(3)]
+            results.append(len(sampler.sample_record(make_fields(), session, True, False)))
+            self.assertIn(results, ([1, 1, 1, 1], [0, 0, 0, 0]))
+            kept_sessions += results[0]
+        self.assertAlmostEqual(kept_sessions / 2000, 0.3, delta=0.04)
+
+    def test_error_session_released(self):
+        sampler = LogSampler(rate=0.0)
+        first = make_fields(method='GET')
+        second = make_fields(method='POST')
+        error = make_fields(method='PUT')
+        self.assertEqual(sampler.sample_record(first, 's1', False, False), [])
+        self.assertEqual(sampler.sample_record(second, 's1', False, False), [])
+        self.assertEqual(sampler.sample_record(error, 's1', False, True), [first, second, error])
+        parent = make_fields(method='PARENT')
+        self.assertEqual(sampler.sample_record(parent, 's1', True, False), [parent])
+
+        # a session that ends without an error drops its held records
+        self.assertEqual(sampler.sample_record(first, 's2', False, False), [])
+        self.assertEqual(sampler.sample_record(parent, 's2', True, False), [])
+        self.assertEqual(sampler.kept, 4)
+        self.assertEqual(sampler.dropped, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
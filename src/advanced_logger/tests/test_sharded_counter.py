@@ -0,0 +1,101 @@
+import threading
+import unittest
+
+from advanced_logger.counter_helper import CounterSet, ShardedCounter
+
+
+def run_threads(target, count, *args):
+    # starts all the threads together, so their updates overlap.
+    start = threading.Barrier(count)
+
+    def run():
+        start.wait()
+        target(*args)
+    threads = [threading.Thread(target=run) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class TestShardedCounter(unittest.TestCase):
+
+    def test_threads_add(self):
+        counter = ShardedCounter('requests')
+
+        def work():
+            for i in range(20000):
+                counter.add()
+            counter.sub(5)
+            counter.add_many(100, 3)
+        run_threads(work, 8)
+        self.assertEqual(counter.value, 8 * (20000 - 5 + 300))
+        self.assertLessEqual(len(counter._shards), 8)
+
+    def test_shards_reused(self):
+        counter = ShardedCounter('requests')
+        for i in range(5):
+            run_threads(counter.add_many, 2, 10, 1)
+        self.assertEqual(counter.value, 100)
+        # (never more shards than threads running at the same time)
+        self.assertLessEqual(len(counter._shards), 2)
+
+    def test_bounds_on_read(self):
+        counter = ShardedCounter('slot', min_counter=0, max_counter=9, rollover=True)
+        run_threads(counter.add_many, 4, 3, 1)
+        self.assertEqual(counter.value, 12 % 10)
+        counter = ShardedCounter('capped', min_counter=0, max_counter=50)
+        run_threads(counter.add_many, 4, 20, 1)
+        self.assertEqual(counter.value, 50)
+        self.assertEqual(counter.max_value, 50)
+
+    def test_set(self):
+        counter = ShardedCounter('requests')
+        run_threads(counter.add_many, 3, 10, 1)
+        counter.set(5)
+        run_threads(counter.add_many, 3, 10, 1)
+        self.assertEqual(counter.value, 35)
+
+    def test_call_every_per_thread(self):
+        calls = []
+        lock = threading.Lock()
+
+        def call_func(counter):
+            with lock:
+                calls.append(1)
+        counter = ShardedCounter('requests', call_every=10, call_func=call_func)
+
+        def work():
+            for i in range(100):
+                counter.add()
+        run_threads(work, 4)
+        self.assertEqual(len(calls), 4 * 10)
+
+
+class TestShardedCounterSet(unittest.TestCase):
+
+    def test_aggregate_across_threads(self):
+        counters = CounterSet(sharded=True)
+        keys = ['key%s' % i for i in range(5)]
+        for key in keys:
+            counters.new(key)
+
+        def work(offset):
+            for i in range(5000):
+                counters[keys[(i + offset) % len(keys)]].add()
+            counters.bulk_update({key: 10 for key in keys})
+
+        threads = [threading.Thread(target=work, args=(offset,)) for offset in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for key in keys:
+            self.assertIsInstance(counters[key], ShardedCounter)
+            self.assertEqual(counters[key].value, 6 * (1000 + 10), key)
+        self.assertIn('6060', counters.report(header='{value_sum}'))
+
+
+if __name__ == '__main__':
+    unittest.main()